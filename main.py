@@ -1,5 +1,7 @@
 import requests
 import json
+from collections import OrderedDict, deque
+from urllib.parse import urlencode
 from datetime import datetime
 import os
 import pandas as pd
@@ -11,21 +13,141 @@ import tweepy
 import pytumblr
 import praw
 import base64
+import signal
+import threading
+import hashlib
+import shutil
+import subprocess
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 from cryptography.fernet import Fernet
 from dotenv import load_dotenv
 
-load_dotenv('.env')
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
 
-server_id = os.environ['SERVER_ID']
-read_token = os.environ['READ_TOKEN']
-cred_token = os.environ['CRED_TOKEN']
-delete_token = os.environ['DELETE_TOKEN']
-secret_key = os.environ['SECRET_KEY']
-salt = os.environ['SALT']
-dropbox_access_key = os.environ['DROPBOX_ACCESS_KEY']
+
+
+def load_config(override=False):
+    '''
+    Reads the server's configuration from `.env` and the environment into module-level variables.
+
+    :param override:    Whether values in `.env` should replace variables already in the environment, as a boolean.
+    :return:            None
+    :onerror:           Raises KeyError if a required variable is missing.
+
+    Example usage: load_config(override=True) is called on SIGHUP so that rotated tokens take effect without a restart.
+    '''
+    global server_id, read_token, cred_token, delete_token, secret_key, salt, dropbox_access_key, media_staging
+    load_dotenv('.env', override=override)
+    server_id = os.environ['SERVER_ID']
+    read_token = os.environ['READ_TOKEN']
+    cred_token = os.environ['CRED_TOKEN']
+    delete_token = os.environ['DELETE_TOKEN']
+    secret_key = os.environ['SECRET_KEY']
+    salt = os.environ['SALT']
+    dropbox_access_key = os.environ['DROPBOX_ACCESS_KEY']
+    media_staging = os.environ.get('MEDIA_STAGING', 'false').lower() in ('1', 'true', 'yes')
+
+
+load_config()
+
+# One pooled session for every call to the IcyFire API, so connections stay warm for the life of the process.
+session = requests.Session()
+
+shutdown_requested = threading.Event()
+reload_requested = threading.Event()
+workers = {}
+shutdown_hooks = []
+
+dropbox_client = None
+dropbox_client_key = None
+
+# Multimedia garbage collection. A file is only deleted once every timeslot that uses it has been acknowledged.
+GC_INTERVAL = 30
+GC_BATCH_SIZE = 100
+GC_MAX_ATTEMPTS = 10
+GC_POLL_TIMEOUT = 60
+DELETIONS_FILE = './deletions.json'
+SWEEP_INTERVAL = 60 * 60
+ORPHAN_MAX_AGE = 24 * 60 * 60
+PROTECTED_MEDIA = {'PLACEHOLDER', 'logo.jpg'}
+media_lock = threading.Lock()
+media_refs = {}
+media_unacknowledged = set()
+media_variants = {}
+remote_deletions = {}
+gc_wake = threading.Event()
+
+# Per-platform upload limits, rounded down from each platform's published limits.
+MEDIA_PROFILES = {
+    'facebook': {'image_max_bytes': 4 * 1024 * 1024, 'image_max_side': 2048, 'video_max_bytes': 1024 * 1024 * 1024, 'video_max_duration': 240 * 60, 'video_codecs': ('h264',)},
+    'twitter': {'image_max_bytes': 5 * 1024 * 1024, 'image_max_side': 4096, 'video_max_bytes': 512 * 1024 * 1024, 'video_max_duration': 140, 'video_codecs': ('h264',)},
+    'tumblr': {'image_max_bytes': 10 * 1024 * 1024, 'image_max_side': 2048, 'video_max_bytes': 100 * 1024 * 1024, 'video_max_duration': 10 * 60, 'video_codecs': ('h264',)},
+    'reddit': {'image_max_bytes': 20 * 1024 * 1024, 'image_max_side': 4096, 'video_max_bytes': 1024 * 1024 * 1024, 'video_max_duration': 15 * 60, 'video_codecs': ('h264', 'hevc', 'vp9')},
+}
+media_pool = None
+media_hashes = {}
+
+GRAPH_URL = 'https://graph.facebook.com'
+GRAPH_VIDEO_URL = 'https://graph-video.facebook.com'
+GRAPH_BATCH_SIZE = 50
+facebook_outbox = []
+
+# Queue deletions ("acks") are buffered, saved to disk until the IcyFire API confirms them, and sent in batches.
+ACK_FILE = './acks.json'
+ACK_FLUSH_INTERVAL = 5
+ACK_BATCH_SIZE = 20
+BULK_ACK_RETRY_INTERVAL = 60 * 60
+ACK_MAX_AGE = 24 * 60 * 60
+ack_lock = threading.Lock()
+ack_wake = threading.Event()
+pending_acks = {}
+ack_stats = {'confirmed': 0, 'failures': 0, 'latency_total': 0.0, 'latency_max': 0.0}
+bulk_acks_unavailable_at = 0
+
+# Decrypted credentials, keyed by a hash of their ciphertexts.
+CREDENTIAL_TTL = 60 * 60
+CREDENTIAL_CACHE_SIZE = 256
+credential_lock = threading.Lock()
+credential_cache = OrderedDict()
+fernet = None
+fernet_source = None
+
+# The local schedule of upcoming timeslots, refreshed a few times an hour instead of read one minute at a time.
+SCHEDULE_WINDOW = 20
+SCHEDULE_REFRESH = 15 * 60
+RANGE_READ_RETRY_INTERVAL = 60 * 60
+READ_CONCURRENCY = 4
+schedule_lock = threading.Lock()
+schedule = {}
+schedule_window = set()
+schedule_refreshed_at = 0
+range_reads_unavailable_at = 0
+
+# Rolling per-platform, per-post_type history of stage durations and lateness, used to start work early enough to hit each slot's target second.
+SLOT_TARGET_SECOND = 0
+SLO_TARGET = 10
+SLO_PERCENT = 99
+SLO_REPORT_INTERVAL = 60 * 60
+TIMINGS_FILE = './timings.json'
+TIMING_HISTORY = 100
+LATENESS_HISTORY = 1000
+MAX_PUBLISH_LEAD = 30
+DEFAULT_MEDIA_LEAD = 60
+PREFETCH_MARGIN = 10
+PREFETCH_POLL = 1
+timing_lock = threading.Lock()
+stage_timings = {}
+lateness_history = {}
+slot_clock = {}
+prepared = {}
+prefetch_pool = None
 
 
 def calculate_min(server_id):
@@ -120,26 +242,207 @@ def current_slot(df):
     return int(df[(df.Day_of_Week == day_of_week) & (df.Time == time)].iloc[0]['Timeslot'])
 
 
-def decrypt(message):
+def get_fernet():
     '''
-    Decrypts social media creds that are sent over by the IcyFire API.
+    Returns the Fernet cipher for SECRET_KEY and SALT. The PBKDF2 key derivation is only repeated if either value changes.
 
-    :param message:     The encrypted string.
-    :return:            The decrypted string.
-    :rtype:             String
+    :return:        The cipher.
+    :rtype:         cryptography.fernet.Fernet
+    :onerror:       No error handling.
+    '''
+    global fernet, fernet_source
+    if fernet is None or fernet_source != (secret_key, salt):
+        kdf = PBKDF2HMAC(algorithm=hashes.SHA256(), length=32, salt=salt.encode(), iterations=100000, backend=default_backend())
+        key = base64.urlsafe_b64encode(kdf.derive(secret_key.encode()))
+        fernet = Fernet(key)
+        fernet_source = (secret_key, salt)
+    return fernet
+
+
+def wipe_credentials(entry):
+    '''
+    Overwrites a cache entry's decrypted values with zeros. This is best effort: copies handed out as strings can't be wiped.
+
+    :param entry:   A cache entry, as a tuple of (expiry time, dictionary of bytearrays).
+    :return:        None
+    :onerror:       No error handling.
+    '''
+    for value in entry[1].values():
+        value[:] = bytes(len(value))
+
+
+def clear_credential_cache():
+    '''
+    Wipes and empties the credential cache, e.g. after SECRET_KEY has been reloaded.
+
+    :return:        None
+    :onerror:       No error handling.
+    '''
+    with credential_lock:
+        while credential_cache:
+            wipe_credentials(credential_cache.popitem()[1])
+
+
+def decrypt_credentials(post, fields):
+    '''
+    Decrypts the given fields of a post, caching the result under a hash of the ciphertexts. Repeat posts from the same account are then a dictionary lookup, and rotated tokens miss the cache because their ciphertext changes. Entries expire after CREDENTIAL_TTL seconds, and the least recently used entry is evicted once there are more than CREDENTIAL_CACHE_SIZE.
+
+    :param post:    The decoded JSON returned by the IcyFire API for a timeslot, as a dictionary.
+    :param fields:  The names of the encrypted fields, as a tuple of strings.
+    :return:        The decrypted fields.
+    :rtype:         Dictionary
+    :onerror:       No error handling.
+
+    Example usage: decrypt_credentials(post, ('access_token',)) would return {'access_token': 'plaintext'}.
+    '''
+    digest = hashlib.sha256(json.dumps([[field, post[field]] for field in fields]).encode()).hexdigest()
+    now = time.time()
+    with credential_lock:
+        entry = credential_cache.get(digest)
+        if entry is not None and entry[0] > now:
+            credential_cache.move_to_end(digest)
+            return {field: value.decode() for field, value in entry[1].items()}
+    values = {field: bytearray(get_fernet().decrypt(post[field].encode())) for field in fields}
+    decrypted = {field: value.decode() for field, value in values.items()}
+    with credential_lock:
+        if digest in credential_cache:
+            wipe_credentials(credential_cache.pop(digest))
+        credential_cache[digest] = (now + CREDENTIAL_TTL, values)
+        for key in [key for key, cached in credential_cache.items() if cached[0] <= now]:
+            wipe_credentials(credential_cache.pop(key))
+        while len(credential_cache) > CREDENTIAL_CACHE_SIZE:
+            wipe_credentials(credential_cache.popitem(last=False)[1])
+    return decrypted
+
+
+def handle_shutdown(signum, frame):
+    '''
+    Signal handler for SIGTERM and SIGINT. Asks the main loop to stop once the slot in progress has finished publishing. It only sets an event, since printing here could interrupt one of the main thread's prints.
+
+    :param signum:  The signal number, as an integer.
+    :param frame:   The interrupted stack frame.
+    :return:        None
+    :onerror:       No error handling.
+    '''
+    shutdown_requested.set()
+
+
+def handle_reload(signum, frame):
+    '''
+    Signal handler for SIGHUP. Asks the main loop to reload its configuration before the next slot. It only sets an event, since printing here could interrupt one of the main thread's prints.
+
+    :param signum:  The signal number, as an integer.
+    :param frame:   The interrupted stack frame.
+    :return:        None
+    :onerror:       No error handling.
+    '''
+    reload_requested.set()
+
+
+def install_signal_handlers():
+    '''
+    Routes SIGTERM/SIGINT to a graceful drain and SIGHUP to an in-place config reload.
+
+    :return:        None
+    :onerror:       No error handling.
+    '''
+    signal.signal(signal.SIGTERM, handle_shutdown)
+    signal.signal(signal.SIGINT, handle_shutdown)
+    signal.signal(signal.SIGHUP, handle_reload)
+
+
+def on_shutdown(func):
+    '''
+    Registers a function to be called, in registration order, after the main loop has drained.
+
+    :param func:    A function that takes no arguments.
+    :return:        The same function, so this can be used as a decorator.
+    :onerror:       No error handling.
+    '''
+    shutdown_hooks.append(func)
+    return func
+
+
+def start_worker(name, target):
+    '''
+    Starts a background worker thread and registers it with the supervisor.
+
+    :param name:    A unique worker name, as a string.
+    :param target:  A function that takes no arguments and runs until `shutdown_requested` is set.
+    :return:        The started thread.
+    :rtype:         threading.Thread
+    :onerror:       No error handling.
+    '''
+    thread = threading.Thread(target=target, name=name, daemon=True)
+    thread.start()
+    workers[name] = (target, thread)
+    return thread
+
+
+def supervise_workers():
+    '''
+    Restarts any background worker whose thread has died. Healthy workers are left alone.
+
+    :return:        None
+    :onerror:       No error handling.
+    '''
+    if shutdown_requested.is_set():
+        return
+    for name, (target, thread) in list(workers.items()):
+        if not thread.is_alive():
+            print("     WARNING: Worker '{}' crashed; restarting it...".format(name))
+            start_worker(name, target)
+
+
+def drain(timeout=30):
+    '''
+    Waits for background workers to stop, then runs the shutdown hooks (e.g. flushing acknowledgements).
+
+    :param timeout: The maximum number of seconds to wait for each worker, as an integer.
+    :return:        None
+    :onerror:       Prints the error as a string and carries on with the next hook.
+    '''
+    shutdown_requested.set()
+    # Wake the workers from their interval sleeps so they notice the shutdown straight away.
+    gc_wake.set()
+    ack_wake.set()
+    for name, (target, thread) in list(workers.items()):
+        thread.join(timeout)
+    for hook in shutdown_hooks:
+        try:
+            hook()
+        except Exception as e:
+            print("Shutdown hook error: {}".format(str(e)))
+
+
+def wait_until(deadline):
+    '''
+    Sleeps until the given UNIX timestamp, waking early if a shutdown is requested.
+
+    :param deadline:    The UNIX timestamp to wake up at, as a float.
+    :return:            True if the deadline was reached, False if a shutdown was requested first.
+    :rtype:             Boolean
     :onerror:           No error handling.
+    '''
+    remaining = deadline - time.time()
+    if remaining > 0:
+        return not shutdown_requested.wait(remaining)
+    return not shutdown_requested.is_set()
+
 
-    Example usage: decrypt('G4rbl3dYg00k') would return str('plaintext').
+def get_dropbox():
     '''
-    password_provided = os.environ['SECRET_KEY']
-    password = password_provided.encode()
-    salt = os.environ['SALT'].encode()
-    kdf = PBKDF2HMAC(algorithm=hashes.SHA256(), length=32, salt=salt, iterations=100000, backend=default_backend())
-    key = base64.urlsafe_b64encode(kdf.derive(password))
-    message = message.encode()
-    f = Fernet(key)
-    decrypted = f.decrypt(message)
-    return decrypted.decode()
+    Returns a shared Dropbox client, creating a new one only if the access key has changed since the last call.
+
+    :return:        A Dropbox client.
+    :rtype:         dropbox.Dropbox
+    :onerror:       No error handling.
+    '''
+    global dropbox_client, dropbox_client_key
+    if dropbox_client is None or dropbox_client_key != dropbox_access_key:
+        dropbox_client = dropbox.Dropbox(dropbox_access_key)
+        dropbox_client_key = dropbox_access_key
+    return dropbox_client
 
 
 def download_multimedia(multimedia_url):
@@ -155,7 +458,7 @@ def download_multimedia(multimedia_url):
     file_name = str(multimedia_url).split('/')[-1]
     if not os.path.exists('./multimedia/{}'.format(file_name)):
         try:
-            dbx = dropbox.Dropbox(os.environ['DROPBOX_ACCESS_KEY'])
+            dbx = get_dropbox()
             with open(f"./multimedia/{file_name}", 'wb') as f:
                 metadata, res = dbx.files_download(path='/multimedia/{}'.format(file_name))
                 f.write(res.content)
@@ -163,67 +466,624 @@ def download_multimedia(multimedia_url):
             print('Download multimedia error: {}'.format(str(e)))
 
 
-def delete_multimedia(multimedia_url):
+def hash_multimedia(path):
     '''
-    If the file exists, this function deletes it locally and from Dropbox.
+    Returns the SHA-256 of a local file, remembering it for as long as the file's size and modification time are unchanged.
+
+    :param path:    The local file path, as a string.
+    :return:        The hex digest.
+    :rtype:         String
+    :onerror:       No error handling.
+    '''
+    stat = os.stat(path)
+    key = (path, stat.st_size, stat.st_mtime)
+    if key not in media_hashes:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        media_hashes[key] = digest.hexdigest()
+    return media_hashes[key]
+
+
+def probe_video(path):
+    '''
+    Uses ffprobe to read a video's duration and codec.
+
+    :param path:    The local file path, as a string.
+    :return:        A dictionary with "duration" (seconds, as a float) and "codec" (as a string), or None if ffprobe is unavailable or fails.
+    :rtype:         Dictionary
+    :onerror:       Returns None.
+    '''
+    if shutil.which('ffprobe') is None:
+        return None
+    try:
+        output = subprocess.run(['ffprobe', '-v', 'error', '-select_streams', 'v:0', '-show_entries', 'stream=codec_name:format=duration', '-of', 'json', path], capture_output=True, check=True, timeout=60).stdout
+        probe = json.loads(output)
+        return {'duration': float(probe['format']['duration']), 'codec': probe['streams'][0]['codec_name']}
+    except Exception:
+        return None
+
+
+def fit_image(source, stem, max_bytes, max_side):
+    '''
+    Downscales and recompresses an image until it fits within `max_side` pixels and `max_bytes` bytes. Transparent PNGs stay PNG if they fit; everything else is written as JPEG, shrinking further if the lowest quality still doesn't fit. Runs in the media process pool.
+
+    :param source:          The original file path, as a string.
+    :param stem:            The path to write the variant to, without an extension, as a string.
+    :param max_bytes:       The maximum file size, as an integer.
+    :param max_side:        The maximum width or height, as an integer.
+    :return:                The path to upload, with the extension of the format actually written, or `source` if it already fits or can't be made to fit.
+    :rtype:                 String
+    :onerror:               Returns `source`.
+    '''
+    destination = None
+    try:
+        with Image.open(source) as image:
+            if getattr(image, 'is_animated', False):
+                return source
+            if os.path.getsize(source) <= max_bytes and max(image.size) <= max_side:
+                return source
+            image.thumbnail((max_side, max_side))
+            transparent = image.mode in ('RGBA', 'LA', 'P')
+            if transparent and source.lower().endswith('.png'):
+                destination = stem + '.png'
+                image.save(destination, format='PNG', optimize=True)
+                if os.path.getsize(destination) <= max_bytes:
+                    return destination
+                os.remove(destination)
+            if transparent:
+                # Flatten onto white rather than letting the transparent areas turn black.
+                background = Image.new('RGB', image.size, (255, 255, 255))
+                background.paste(image, mask=image.convert('RGBA').split()[-1])
+                image = background
+            else:
+                image = image.convert('RGB')
+            destination = stem + '.jpg'
+            quality = 90
+            image.save(destination, format='JPEG', quality=quality, optimize=True)
+            while os.path.getsize(destination) > max_bytes:
+                if quality > 40:
+                    quality -= 10
+                elif max(image.size) > 256:
+                    image.thumbnail((max(image.size) * 3 // 4, max(image.size) * 3 // 4))
+                else:
+                    break
+                image.save(destination, format='JPEG', quality=quality, optimize=True)
+            if os.path.getsize(destination) > max_bytes:
+                os.remove(destination)
+                return source
+        return destination
+    except Exception as e:
+        print("     Stage image error: {}".format(str(e)))
+        if destination is not None and os.path.exists(destination):
+            os.remove(destination)
+        return source
+
+
+def fit_video(source, destination, max_bytes, duration):
+    '''
+    Transcodes a video to H.264/AAC MP4 at a bitrate that fits `max_bytes` over `duration`. Runs in the media process pool.
+
+    :param source:          The original file path, as a string.
+    :param destination:     The path to write the variant to, as a string.
+    :param max_bytes:       The maximum file size, as an integer.
+    :param duration:        The video's duration in seconds, as a float.
+    :return:                The path to upload, which is `source` if transcoding fails.
+    :rtype:                 String
+    :onerror:               Returns `source`.
+    '''
+    # Leave 10% headroom for the container and audio track.
+    bitrate = min(int(max_bytes * 8 * 0.9 / max(duration, 1)), 8000000)
+    partial = destination + '.part'
+    try:
+        subprocess.run(['ffmpeg', '-y', '-v', 'error', '-i', source, '-c:v', 'libx264', '-preset', 'veryfast', '-b:v', str(bitrate), '-maxrate', str(bitrate), '-bufsize', str(bitrate * 2), '-c:a', 'aac', '-b:a', '128k', '-movflags', '+faststart', '-f', 'mp4', partial], check=True, timeout=30 * 60)
+        os.replace(partial, destination)
+        return destination
+    except Exception as e:
+        print("     Stage video error: {}".format(str(e)))
+        if os.path.exists(partial):
+            os.remove(partial)
+        return source
+
+
+def get_media_pool():
+    '''
+    Returns the shared process pool used for image and video processing, creating it on first use. Workers are started by a forkserver rather than forked, because by then other threads may be holding locks (such as stdout's) that a forked child would inherit and deadlock on.
+
+    :return:        The process pool.
+    :rtype:         concurrent.futures.ProcessPoolExecutor
+    :onerror:       No error handling.
+    '''
+    global media_pool
+    if media_pool is None:
+        media_pool = ProcessPoolExecutor(max_workers=2, mp_context=multiprocessing.get_context('forkserver'))
+    return media_pool
+
+
+def stop_media_pools():
+    '''
+    Shutdown hook that stops the media process pool and the prefetch pool without waiting for them. Prefetch and staging work that hasn't started is cancelled, since nothing will publish it.
+
+    :return:        None
+    :onerror:       No error handling.
+    '''
+    for pool in (prefetch_pool, media_pool):
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+def track_variant(file_name, variant):
+    '''
+    Records a staged variant next to its original, so that it is deleted when the original is released.
+
+    :param file_name:   The original file name, as a string.
+    :param variant:     The variant file name, as a string.
+    :return:            The variant file name.
+    :rtype:             String
+    :onerror:           No error handling.
+    '''
+    with media_lock:
+        media_variants.setdefault(file_name, set()).add(variant)
+    return variant
 
-    :param file_name:   The file name and extension, as a string.
-    :return:            Deletion of file object
-    :onerror:           Prints error as a string.
 
-    Example usage: delete_multimedia('example.jpg') would delete "Dropbox/multimedia/example.jpg" as well as the local file stored at "./multimedia/example.jpg".
+def stage_multimedia(multimedia_url, platform, post_type):
+    '''
+    If MEDIA_STAGING is enabled, fits a downloaded file to the platform's limits before upload. Variants are saved in ./multimedia as "<content hash>-<platform><extension>", so the same asset is only processed once per platform.
+
+    :param multimedia_url:  The multimedia URL, as a string.
+    :param platform:        The target platform, as a string.
+    :param post_type:       3 for an image or 4 for a video, as an integer.
+    :return:                The file name to upload (the original or a variant), or None if the file can't be made to fit.
+    :rtype:                 String
+    :onerror:               Prints error as a string and returns the original file name.
+
+    Example usage: stage_multimedia('example.jpg', 'twitter', 3) for a 12 MB photo would return str('9f86d081884c7d65-twitter.jpg').
+    '''
+    file_name = str(multimedia_url).split('/')[-1]
+    if not media_staging:
+        return file_name
+    source = './multimedia/{}'.format(file_name)
+    profile = MEDIA_PROFILES.get(platform, MEDIA_PROFILES['reddit'])
+    try:
+        stem = './multimedia/{}-{}'.format(hash_multimedia(source)[:16], platform)
+        for extension in (('.jpg', '.png') if post_type == 3 else ('.mp4',)):
+            if os.path.exists(stem + extension):
+                os.utime(stem + extension)
+                return track_variant(file_name, os.path.basename(stem + extension))
+
+        if post_type == 3:
+            if Image is None:
+                return file_name
+            staged = get_media_pool().submit(fit_image, source, stem, profile['image_max_bytes'], profile['image_max_side']).result()
+        else:
+            probe = probe_video(source)
+            if probe is None:
+                return file_name
+            if probe['duration'] > profile['video_max_duration']:
+                print("     Video is {:.0f}s long; {} allows {}s.".format(probe['duration'], platform, profile['video_max_duration']))
+                return None
+            if os.path.getsize(source) <= profile['video_max_bytes'] and probe['codec'] in profile['video_codecs']:
+                return file_name
+            if shutil.which('ffmpeg') is None:
+                return file_name
+            staged = get_media_pool().submit(fit_video, source, stem + '.mp4', profile['video_max_bytes'], probe['duration']).result()
+
+        if staged != source:
+            print("     Staged multimedia: {} bytes -> {} bytes".format(os.path.getsize(source), os.path.getsize(staged)))
+            return track_variant(file_name, os.path.basename(staged))
+        return file_name
+    except Exception as e:
+        print("     Stage multimedia error: {}".format(str(e)))
+        return file_name
+
+
+def retain_multimedia(multimedia_url, x):
+    '''
+    Records that timeslot `x` needs the file, so that the garbage collector leaves it alone until the slot is done.
+
+    :param multimedia_url:  The multimedia URL, as a string.
+    :param x:               The timeslot ID, as an integer.
+    :return:                None
+    :onerror:               No error handling.
+    '''
+    file_name = str(multimedia_url).split('/')[-1]
+    with media_lock:
+        media_refs.setdefault(file_name, set()).add(x)
+
+
+def release_multimedia(multimedia_url, x, acknowledged):
+    '''
+    Drops timeslot `x`'s reference to the file. Once no slot references it any more, its staged variants are removed, and so are the local copy and (through a batched deletion) the Dropbox copy, unless one of the slots was not acknowledged (the post is still queued, so the original is still needed).
+
+    :param multimedia_url:  The multimedia URL, as a string.
+    :param x:               The timeslot ID, as an integer.
+    :param acknowledged:    Whether the post was published and deleted from the queue, as a boolean.
+    :return:                None
+    :onerror:               Prints error as a string.
+
+    Example usage: release_multimedia('example.jpg', 42, True) after the last slot using "example.jpg" would delete "./multimedia/example.jpg" and queue "Dropbox/multimedia/example.jpg" for deletion.
     '''
     file_name = str(multimedia_url).split('/')[-1]
-    if os.path.exists('./multimedia/{}'.format(file_name)):
-        os.remove('./multimedia/{}'.format(file_name))
+    with media_lock:
+        refs = media_refs.get(file_name, set())
+        refs.discard(x)
+        if not acknowledged:
+            media_unacknowledged.add(file_name)
+        if refs:
+            return
+        media_refs.pop(file_name, None)
+        local_files = sorted(media_variants.pop(file_name, set()))
+        if file_name in media_unacknowledged:
+            media_unacknowledged.discard(file_name)
+        else:
+            local_files.append(file_name)
+            remote_deletions.setdefault('/multimedia/{}'.format(file_name), 0)
+            save_remote_deletions()
+    for local_file in local_files:
+        try:
+            if os.path.exists('./multimedia/{}'.format(local_file)):
+                os.remove('./multimedia/{}'.format(local_file))
+        except Exception as e:
+            print("Delete multimedia error: {}".format(str(e)))
+    if len(remote_deletions) >= GC_BATCH_SIZE:
+        gc_wake.set()
+
+
+def load_remote_deletions():
+    '''
+    Restores Dropbox deletions that were saved to DELETIONS_FILE but not completed, e.g. because the server crashed or was restarted.
+
+    :return:        None
+    :onerror:       Prints error as a string and starts with no queued deletions.
+    '''
+    if not os.path.exists(DELETIONS_FILE):
+        return
+    try:
+        with open(DELETIONS_FILE) as f:
+            saved = json.load(f)
+        with media_lock:
+            remote_deletions.update(saved)
+        print("Restored {} queued Dropbox deletion(s).".format(len(saved)))
+    except Exception as e:
+        print("Load deletions error: {}".format(str(e)))
+
+
+def save_remote_deletions():
+    '''
+    Atomically writes the queued Dropbox deletions and their attempt counts to DELETIONS_FILE. The caller must hold `media_lock`.
+
+    :return:        None
+    :onerror:       Prints error as a string.
+    '''
     try:
-        dbx = dropbox.Dropbox(os.environ['DROPBOX_ACCESS_KEY'])
-        dbx.files_delete_v2(path='/multimedia/{}'.format(file_name))
+        with open(DELETIONS_FILE + '.tmp', 'w') as f:
+            json.dump(remote_deletions, f)
+        os.replace(DELETIONS_FILE + '.tmp', DELETIONS_FILE)
+    except Exception as e:
+        print("Save deletions error: {}".format(str(e)))
+
+
+def delete_remote_multimedia():
+    '''
+    Deletes every queued Dropbox path in one `files_delete_batch` call, waiting up to GC_POLL_TIMEOUT seconds for the batch job. Paths that fail are kept for the next pass, up to `GC_MAX_ATTEMPTS` attempts.
+
+    :return:        None
+    :onerror:       Prints error as a string; the paths stay queued.
+    '''
+    with media_lock:
+        paths = list(remote_deletions)[:GC_BATCH_SIZE]
+    if not paths:
+        return
+    failed = set(paths)
+    try:
+        dbx = get_dropbox()
+        launch = dbx.files_delete_batch([dropbox.files.DeleteArg(path) for path in paths])
+        if launch.is_async_job_id():
+            job_id = launch.get_async_job_id()
+            status = dbx.files_delete_batch_check(job_id)
+            # Poll against a fixed deadline rather than `shutdown_requested`, so the shutdown hook can still wait for the job.
+            deadline = time.time() + GC_POLL_TIMEOUT
+            while status.is_in_progress() and time.time() < deadline:
+                time.sleep(1)
+                status = dbx.files_delete_batch_check(job_id)
+            result = status.get_complete() if status.is_complete() else None
+        elif launch.is_complete():
+            result = launch.get_complete()
+        else:
+            result = None
+        if result is not None:
+            for path, entry in zip(paths, result.entries):
+                if entry.is_success():
+                    failed.discard(path)
+                else:
+                    error = entry.get_failure()
+                    # Already gone is as good as deleted.
+                    if error.is_path_lookup() and error.get_path_lookup().is_not_found():
+                        failed.discard(path)
     except Exception as e:
         print("Delete multimedia error: {}".format(str(e)))
+    with media_lock:
+        for path in paths:
+            if path not in failed:
+                remote_deletions.pop(path, None)
+                continue
+            remote_deletions[path] += 1
+            if remote_deletions[path] >= GC_MAX_ATTEMPTS:
+                print("Delete multimedia error: giving up on {} after {} attempts".format(path, remote_deletions[path]))
+                remote_deletions.pop(path, None)
+        save_remote_deletions()
+
+
+def sweep_multimedia(max_age=ORPHAN_MAX_AGE):
+    '''
+    Removes local files in ./multimedia that no slot references and that have not been touched for `max_age` seconds, e.g. files left behind by a crash. Dropbox copies are not touched, since the post may still be queued.
+
+    :param max_age:     The minimum age of an orphaned file, in seconds, as an integer.
+    :return:            None
+    :onerror:           Prints error as a string.
+    '''
+    now = time.time()
+    for file_name in os.listdir('./multimedia'):
+        path = './multimedia/{}'.format(file_name)
+        with media_lock:
+            in_use = file_name in media_refs or any(file_name in media_variants.get(original, ()) for original in media_refs)
+            if file_name in PROTECTED_MEDIA or in_use:
+                continue
+        try:
+            if os.path.isfile(path) and now - os.path.getmtime(path) > max_age:
+                os.remove(path)
+                print("Removed orphaned multimedia: {}".format(file_name))
+        except Exception as e:
+            print("Sweep multimedia error: {}".format(str(e)))
 
 
-def facebook_short_text(access_token, page_id, body, link_url, tags, x, read_token, delete_token, server_id):
+def collect_garbage():
     '''
-    Publishes a short text post to Facebook, then deletes it from the queue.
+    Background worker that batches Dropbox deletions every `GC_INTERVAL` seconds (or sooner once `GC_BATCH_SIZE` are queued) and sweeps orphaned local files every `SWEEP_INTERVAL` seconds.
 
-    :param access_token:    The account's decrypted access token, as a string.
-    :param page_id:         The name of the target page, as a string.
-    :param body:            The post body, as a string.
-    :param link_url:        The link URL, as a string.
-    :param tags:            Unprocessed tags, as a string.
-    :return:                A Facebook submission object.
-    :onerror:               Prints the status code.
+    :return:        None
+    :onerror:       Exceptions propagate, and the supervisor restarts the worker.
     '''
-    if link_url is None:
-        link_url = ''
-    if tags is None:
-        tags = ''
-    else:
-        tags = str(tags).split(', ')
-        tags = ' #'.join(tags)
-        tags = '#' + tags
-    message = body + '\n' + tags + '\n' + link_url
-    fb = requests.post(f'https://graph.facebook.com/{page_id}/feed?message={message}&access_token={access_token}')
-    if fb.status_code == 200:
-        print("     Deleting post from queue...")
-        requests.get(f'https://icy-fire.com/api/_d/{x}/auth={read_token}&{delete_token}&{server_id}')
-    else:
-        print('     Facebook short text status code: {}'.format(fb.status_code))
+    last_sweep = 0
+    while not shutdown_requested.is_set():
+        if time.time() - last_sweep > SWEEP_INTERVAL:
+            sweep_multimedia()
+            last_sweep = time.time()
+        delete_remote_multimedia()
+        gc_wake.wait(GC_INTERVAL)
+        gc_wake.clear()
 
 
-def facebook_long_text(access_token, page_id, body, link_url, tags, x, read_token, delete_token, server_id):
+def flush_remote_multimedia():
     '''
-    Publishes a long text post to Facebook, then deletes it from the queue.
+    Shutdown hook that makes one last attempt at the queued Dropbox deletions. It is registered after `flush_acks`, so it also covers multimedia released by the final acknowledgements. Anything left stays in DELETIONS_FILE for the next run.
 
-    :param access_token:    The account's decrypted access token, as a string.
-    :param page_id:         The name of the target page, as a string.
-    :param body:            The post body, as a string.
-    :param link_url:        The link URL, as a string.
-    :param tags:            Unprocessed tags, as a string.
-    :return:                A Facebook submission object.
-    :onerror:               Prints the status code.
+    :return:        None
+    :onerror:       No error handling.
+    '''
+    while remote_deletions:
+        pending = len(remote_deletions)
+        delete_remote_multimedia()
+        if len(remote_deletions) >= pending:
+            break
+
+
+def load_acks():
+    '''
+    Restores acknowledgements that were saved to ACK_FILE but never confirmed by the IcyFire API, e.g. because the server was stopped.
+
+    :return:        None
+    :onerror:       Prints error as a string and starts with no pending acknowledgements.
+    '''
+    if not os.path.exists(ACK_FILE):
+        return
+    try:
+        with open(ACK_FILE) as f:
+            saved = json.load(f)
+        with ack_lock:
+            for record in saved:
+                pending_acks[int(record['x'])] = record
+        print("Restored {} unconfirmed acknowledgement(s).".format(len(saved)))
+    except Exception as e:
+        print("Load acknowledgements error: {}".format(str(e)))
+
+
+def save_acks():
+    '''
+    Atomically writes the pending acknowledgements to ACK_FILE. The caller must hold `ack_lock`.
+
+    :return:        None
+    :onerror:       Prints error as a string.
+    '''
+    try:
+        with open(ACK_FILE + '.tmp', 'w') as f:
+            json.dump(list(pending_acks.values()), f)
+        os.replace(ACK_FILE + '.tmp', ACK_FILE)
+    except Exception as e:
+        print("Save acknowledgements error: {}".format(str(e)))
+
+
+def delete_from_queue(x, read_token, delete_token, server_id):
+    '''
+    Queues a published post for deletion from the IcyFire queue. The acknowledgement is saved to ACK_FILE and sent in batches by the `send_acks` worker, which retries it until the IcyFire API confirms it or ACK_MAX_AGE passes. The tokens in effect when the batch is sent are used, so a reload doesn't strand old acknowledgements.
+
+    :param x:               The timeslot ID, as an integer.
+    :param read_token:      The read token, as a string.
+    :param delete_token:    The delete token, as a string.
+    :param server_id:       The server ID, as a string.
+    :return:                True, since the acknowledgement is saved and will be retried.
+    :rtype:                 Boolean
+    :onerror:               No error handling.
+    '''
+    with ack_lock:
+        pending_acks[x] = {'x': x, 'queued_at': time.time(), 'attempts': 0, 'multimedia_url': None}
+        save_acks()
+        if len(pending_acks) >= ACK_BATCH_SIZE:
+            ack_wake.set()
+    return True
+
+
+def is_awaiting_ack(x):
+    '''
+    Checks whether timeslot `x` has been published but its deletion from the queue has not been confirmed yet.
+
+    :param x:       The timeslot ID, as an integer.
+    :return:        True if the timeslot is waiting on an acknowledgement.
+    :rtype:         Boolean
+    :onerror:       No error handling.
+    '''
+    with ack_lock:
+        return x in pending_acks
+
+
+def release_multimedia_on_ack(multimedia_url, x):
+    '''
+    Releases timeslot `x`'s multimedia once its acknowledgement is confirmed, or straight away if it already has been. The URL is saved with the acknowledgement, so the file is still cleaned up after a restart.
+
+    :param multimedia_url:  The multimedia URL, as a string.
+    :param x:               The timeslot ID, as an integer.
+    :return:                None
+    :onerror:               No error handling.
+    '''
+    with ack_lock:
+        if x in pending_acks:
+            pending_acks[x]['multimedia_url'] = multimedia_url
+            save_acks()
+            return
+    release_multimedia(multimedia_url, x, True)
+
+
+def send_bulk_acks(timeslots):
+    '''
+    Deletes several timeslots from the IcyFire queue in one request to the bulk delete endpoint.
+
+    :param timeslots:   The timeslot IDs, as a list of integers.
+    :return:            The timeslot IDs the response explicitly lists as deleted, or None if the endpoint isn't available or doesn't answer in the expected format.
+    :rtype:             Set
+    :onerror:           Returns an empty set if the request fails.
+    '''
+    global bulk_acks_unavailable_at
+    try:
+        response = session.post(f'https://icy-fire.com/api/_d/batch/auth={read_token}&{delete_token}&{server_id}', json={'timeslots': timeslots})
+    except Exception as e:
+        print("Bulk acknowledgement error: {}".format(str(e)))
+        return set()
+    if response.status_code in (400, 404, 405, 501):
+        print("INFO: Bulk delete endpoint unavailable ({}); deleting timeslots one at a time.".format(response.status_code))
+        bulk_acks_unavailable_at = time.time()
+        return None
+    if response.status_code != 200:
+        print("Bulk acknowledgement status code: {}".format(response.status_code))
+        return set()
+    try:
+        return set(int(x) for x in response.json()['deleted'])
+    except Exception:
+        # A 200 without a list of deleted timeslots (e.g. a catch-all route) proves nothing, so don't trust the endpoint.
+        print("INFO: Bulk delete endpoint gave an unexpected response; deleting timeslots one at a time.")
+        bulk_acks_unavailable_at = time.time()
+        return None
+
+
+def send_single_ack(x):
+    '''
+    Deletes one timeslot from the IcyFire queue.
+
+    :param x:       The timeslot ID, as an integer.
+    :return:        True if the IcyFire API confirmed the deletion (or the post was already gone).
+    :rtype:         Boolean
+    :onerror:       Prints the status code or error as a string.
+    '''
+    try:
+        response = session.get(f'https://icy-fire.com/api/_d/{x}/auth={read_token}&{delete_token}&{server_id}')
+    except Exception as e:
+        print("Delete from queue error: {}".format(str(e)))
+        return False
+    if response.status_code in (200, 404):
+        return True
+    print("Delete from queue status code for timeslot {}: {}".format(x, response.status_code))
+    return False
+
+
+def flush_acks():
+    '''
+    Sends every pending acknowledgement, through the bulk endpoint when it is available and one at a time when it isn't. Confirmed acknowledgements are removed from ACK_FILE and their multimedia is released; the rest are retried on the next flush, for up to ACK_MAX_AGE seconds.
+
+    :return:        None
+    :onerror:       Failures are counted in `ack_stats` and retried. Acknowledgements older than ACK_MAX_AGE are dropped, well before the timeslot comes round again, so the post may be published twice.
+    '''
+    with ack_lock:
+        timeslots = sorted(pending_acks)
+    if not timeslots:
+        return
+    confirmed = None
+    if time.time() - bulk_acks_unavailable_at > BULK_ACK_RETRY_INTERVAL:
+        confirmed = send_bulk_acks(timeslots)
+    if confirmed is None:
+        confirmed = set(x for x in timeslots if send_single_ack(x))
+
+    now = time.time()
+    released = []
+    abandoned = []
+    with ack_lock:
+        for x in timeslots:
+            record = pending_acks.get(x)
+            if record is None:
+                continue
+            if x in confirmed:
+                del pending_acks[x]
+                latency = now - record['queued_at']
+                ack_stats['confirmed'] += 1
+                ack_stats['latency_total'] += latency
+                ack_stats['latency_max'] = max(ack_stats['latency_max'], latency)
+                if record.get('multimedia_url'):
+                    released.append((record['multimedia_url'], x))
+            else:
+                record['attempts'] += 1
+                ack_stats['failures'] += 1
+                if now - record['queued_at'] > ACK_MAX_AGE:
+                    del pending_acks[x]
+                    print("Delete from queue error: giving up on timeslot {} after {} attempts; it may be published again next week".format(x, record['attempts']))
+                    if record.get('multimedia_url'):
+                        abandoned.append((record['multimedia_url'], x))
+        save_acks()
+    for multimedia_url, x in released:
+        release_multimedia(multimedia_url, x, True)
+    for multimedia_url, x in abandoned:
+        release_multimedia(multimedia_url, x, False)
+    if ack_stats['confirmed']:
+        print("Acknowledged {}/{} timeslot(s); {} pending, {} failure(s), average latency {:.1f}s, max {:.1f}s.".format(len(confirmed), len(timeslots), len(pending_acks), ack_stats['failures'], ack_stats['latency_total'] / ack_stats['confirmed'], ack_stats['latency_max']))
+
+
+def send_acks():
+    '''
+    Background worker that flushes acknowledgements every `ACK_FLUSH_INTERVAL` seconds, or as soon as `ACK_BATCH_SIZE` are pending. The final flush is left to the `flush_acks` shutdown hook, which runs after the main loop has finished its in-flight publishes.
+
+    :return:        None
+    :onerror:       Exceptions propagate, and the supervisor restarts the worker.
+    '''
+    while not shutdown_requested.is_set():
+        ack_wake.wait(ACK_FLUSH_INTERVAL)
+        ack_wake.clear()
+        flush_acks()
+
+
+def facebook_message(body, tags, link_url):
     '''
+    Builds the text of a Facebook post from its body, tags and link.
+
+    :param body:        The post body or caption, as a string.
+    :param tags:        Unprocessed tags, as a string.
+    :param link_url:    The link URL, as a string.
+    :return:            The message.
+    :rtype:             String
+    :onerror:           No error handling.
+
+    Example usage: facebook_message('Hello', 'a, b', None) would return str('Hello\n#a #b\n').
+    '''
+    if body is None:
+        body = ''
     if link_url is None:
         link_url = ''
     if tags is None:
@@ -232,43 +1092,142 @@ def facebook_long_text(access_token, page_id, body, link_url, tags, x, read_toke
         tags = str(tags).split(', ')
         tags = ' #'.join(tags)
         tags = '#' + tags
-    message = body + '\n' + tags + '\n' + link_url
-    fb = requests.post(f'https://graph.facebook.com/{page_id}/feed?message={message}&access_token={access_token}')
-    if fb.status_code == 200:
-        print("     Deleting post from queue...")
-        requests.get(f'https://icy-fire.com/api/_d/{x}/auth={read_token}&{delete_token}&{server_id}')
-    else:
-        print('     Facebook long text status code: {}'.format(fb.status_code))
+    return body + '\n' + tags + '\n' + link_url
 
 
-def facebook_image(access_token, page_id, caption, tags, link_url, multimedia_url, x, read_token, delete_token, server_id):
+def facebook_request(access_token, page_id, post_type, message, multimedia_url=None):
     '''
-    Publishes an image post to Facebook, then deletes it from the queue.
+    Describes a single Graph API publish call, so that it can be sent on its own or as part of a batch.
 
-    :param access_token:    The account's decrypted access token, as a string.
+    :param access_token:    The page's decrypted access token, as a string.
     :param page_id:         The name of the target page, as a string.
-    :param caption:         The post body, as a string.
-    :param tags:            Unprocessed tags, as a string.
-    :param file_name:       The name of the local image file to be uploaded, as a string.
-    :return:                A Facebook submission object.
-    :onerror:               Prints the status code.
+    :param post_type:       1 or 2 for text, 3 for an image or 4 for a video, as an integer.
+    :param message:         The text of the post, as a string.
+    :param multimedia_url:  The multimedia URL for image and video posts, as a string.
+    :return:                A dictionary with "relative_url", "body" (form fields) and "file" (a local path, or None).
+    :rtype:                 Dictionary
+    :onerror:               No error handling.
     '''
-    if link_url is None:
-        link_url = ''
-    if tags is None:
-        tags = ''
-    else:
-        tags = str(tags).split(', ')
-        tags = ' #'.join(tags)
-        tags = '#' + tags
-    file_name = str(multimedia_url).split('/')[-1]
-    file_name = './multimedia/{}'.format(file_name)
-    fb = requests.post(f'https://graph.facebook.com/{page_id}/photos?url={file_name}&access_token={access_token}')
-    if fb.status_code == 200:
-        print("     Deleting post from queue...")
-        requests.get(f'https://icy-fire.com/api/_d/{x}/auth={read_token}&{delete_token}&{server_id}')
-    else:
-        print('     Facebook image status code: {}'.format(fb.status_code))
+    if post_type in (1, 2):
+        return {'relative_url': '{}/feed'.format(page_id), 'body': {'message': message, 'access_token': access_token}, 'file': None}
+    file_name = './multimedia/{}'.format(str(multimedia_url).split('/')[-1])
+    if post_type == 3:
+        return {'relative_url': '{}/photos'.format(page_id), 'body': {'caption': message, 'access_token': access_token}, 'file': file_name}
+    return {'relative_url': '{}/videos'.format(page_id), 'body': {'description': message, 'access_token': access_token}, 'file': file_name}
+
+
+def graph_post(request):
+    '''
+    Sends one Graph API publish call, form-encoding the fields and uploading any file as multipart.
+
+    :param request:     A dictionary generated by calling the `facebook_request` function.
+    :return:            The status code and the decoded response body.
+    :rtype:             Tuple
+    :onerror:           Returns status code 0 and the error as a string.
+    '''
+    # Videos have to be uploaded to the dedicated video host.
+    host = GRAPH_VIDEO_URL if request['relative_url'].endswith('/videos') else GRAPH_URL
+    try:
+        if request['file'] is None:
+            response = session.post('{}/{}'.format(host, request['relative_url']), data=request['body'])
+        else:
+            with open(request['file'], 'rb') as f:
+                response = session.post('{}/{}'.format(host, request['relative_url']), data=request['body'], files={'source': f})
+        return response.status_code, response.text
+    except Exception as e:
+        return 0, str(e)
+
+
+def graph_batch(requests_):
+    '''
+    Sends several Graph API publish calls as batch requests of up to `GRAPH_BATCH_SIZE` operations, then splits the results back out. Videos are always sent on their own.
+
+    :param requests_:   A list of dictionaries generated by calling the `facebook_request` function.
+    :return:            A status code and response body for each request, in the same order.
+    :rtype:             List of tuples
+    :onerror:           A failed batch reports status code 0 and the error as a string for each of its requests.
+    '''
+    results = [None] * len(requests_)
+    batchable = []
+    for index, request in enumerate(requests_):
+        if request['relative_url'].endswith('/videos'):
+            results[index] = graph_post(request)
+        else:
+            batchable.append(index)
+    for offset in range(0, len(batchable), GRAPH_BATCH_SIZE):
+        chunk = batchable[offset:offset + GRAPH_BATCH_SIZE]
+        if len(chunk) == 1:
+            results[chunk[0]] = graph_post(requests_[chunk[0]])
+            continue
+        operations = []
+        files = {}
+        try:
+            for index in chunk:
+                request = requests_[index]
+                operation = {'method': 'POST', 'relative_url': request['relative_url'], 'body': urlencode(request['body'])}
+                if request['file'] is not None:
+                    name = 'file{}'.format(index)
+                    files[name] = open(request['file'], 'rb')
+                    operation['attached_files'] = name
+                operations.append(operation)
+            # Every operation carries its own page token; the top-level token only has to be valid.
+            data = {'access_token': requests_[chunk[0]]['body']['access_token'], 'batch': json.dumps(operations)}
+            response = session.post(GRAPH_URL, data=data, files=files or None)
+            if response.status_code != 200:
+                raise Exception('batch status code {}: {}'.format(response.status_code, response.text))
+            for index, item in zip(chunk, response.json()):
+                # Graph returns null for operations it didn't get to before timing out.
+                if item is None:
+                    results[index] = (0, 'Operation timed out')
+                else:
+                    results[index] = (item.get('code', 0), item.get('body', ''))
+        except Exception as e:
+            for index in chunk:
+                if results[index] is None:
+                    results[index] = (0, str(e))
+        finally:
+            for f in files.values():
+                f.close()
+    return results
+
+
+def queue_facebook_post(x, request, callback):
+    '''
+    Adds a Facebook post to the outbox, so that posts that come due together are published in one Graph batch.
+
+    :param x:           The timeslot ID, as an integer.
+    :param request:     A dictionary generated by calling the `facebook_request` function.
+    :param callback:    A function called with True or False once the post has been published and deleted from the queue (or not).
+    :return:            None
+    :onerror:           No error handling.
+    '''
+    facebook_outbox.append((x, request, callback))
+
+
+def flush_facebook_outbox():
+    '''
+    Publishes every post in the Facebook outbox, then deletes each successful post from the queue.
+
+    :return:        None
+    :onerror:       Prints the status code for each failed post.
+    '''
+    if not facebook_outbox:
+        return
+    items = list(facebook_outbox)
+    del facebook_outbox[:]
+    print("Publishing {} Facebook post(s)...".format(len(items)))
+    results = graph_batch([request for x, request, callback in items])
+    for (x, request, callback), (status_code, body) in zip(items, results):
+        acknowledged = False
+        if status_code == 200:
+            print("     Deleting timeslot {} from queue...".format(x))
+            acknowledged = delete_from_queue(x, read_token, delete_token, server_id)
+        else:
+            print('     Facebook status code for timeslot {}: {} {}'.format(x, status_code, body))
+        try:
+            callback(acknowledged)
+        except Exception as e:
+            print("     Facebook callback error: {}".format(str(e)))
 
 
 def facebook_video(access_token, page_id, caption, tags, link_url, multimedia_url, x, read_token, delete_token, server_id):
@@ -280,25 +1239,16 @@ def facebook_video(access_token, page_id, caption, tags, link_url, multimedia_ur
     :param caption:         The post body, as a string.
     :param tags:            Unprocessed tags, as a string.
     :param file_name:       The name of the local video file to be uploaded, as a string.
-    :return:                A Facebook submission object.
+    :return:                True if the post was published and deleted from the queue, otherwise False.
     :onerror:               Prints the status code.
     '''
-    if link_url is None:
-        link_url = ''
-    if tags is None:
-        tags = ''
-    else:
-        tags = str(tags).split(', ')
-        tags = ' #'.join(tags)
-        tags = '#' + tags
-    file_name = str(multimedia_url).split('/')[-1]
-    file_name = './multimedia/{}'.format(file_name)
-    fb = requests.post(f'https://graph.facebook.com/{page_id}/videos?url={file_name}&access_token={access_token}')
-    if fb.status_code == 200:
+    fb, text = graph_post(facebook_request(access_token, page_id, 4, facebook_message(caption, tags, link_url), multimedia_url))
+    if fb == 200:
         print("     Deleting post from queue...")
-        requests.get(f'https://icy-fire.com/api/_d/{x}/auth={read_token}&{delete_token}&{server_id}')
+        return delete_from_queue(x, read_token, delete_token, server_id)
     else:
-        print('     Facebook video status code: {}'.format(fb.status_code))
+        print('     Facebook video status code: {}'.format(fb))
+        return False
 
 
 def twitter_short_text(consumer_key, consumer_secret, access_token_key, access_token_secret, body, link_url, tags, x, read_token, delete_token, server_id):
@@ -312,7 +1262,7 @@ def twitter_short_text(consumer_key, consumer_secret, access_token_key, access_t
     :param body:                    The post body, as a string.
     :param link_url:                The link URL, as a string.
     :param tags:                    Unprocessed hashtags, as a string.
-    :return:                        A Twitter submission object
+    :return:                        True if the post was published and deleted from the queue, otherwise False.
     :onerror:                       Prints error as a string.
     '''
     try:
@@ -327,9 +1277,10 @@ def twitter_short_text(consumer_key, consumer_secret, access_token_key, access_t
             tags = '#' + tags
         api.PostUpdate(body + '\n' + tags + '\n' + link_url)
         print("     Deleting post from queue...")
-        requests.get(f'https://icy-fire.com/api/_d/{x}/auth={read_token}&{delete_token}&{server_id}')
+        return delete_from_queue(x, read_token, delete_token, server_id)
     except Exception as e:
         print("     Twitter short text error: {}".format(str(e)))
+        return False
 
 
 def twitter_image(consumer_key, consumer_secret, access_token_key, access_token_secret, multimedia_url, caption, tags, link_url, x, read_token, delete_token, server_id):
@@ -343,7 +1294,7 @@ def twitter_image(consumer_key, consumer_secret, access_token_key, access_token_
     :param file_name:               The name of the local image file to be uploaded, as a string.
     :param caption:                 The post body, as a string.
     :param tags:                    Unprocessed hashtags, as a string.
-    :return:                        A Twitter submission object
+    :return:                        True if the post was published and deleted from the queue, otherwise False.
     :onerror:                       Prints error as a string.
     '''
     try:
@@ -363,9 +1314,10 @@ def twitter_image(consumer_key, consumer_secret, access_token_key, access_token_
         tweet = caption + '\n' + tags + '\n' + link_url
         post = api.update_status(status=tweet, media_ids=[media.media_id])
         print("     Deleting post from queue...")
-        requests.get(f'https://icy-fire.com/api/_d/{x}/auth={read_token}&{delete_token}&{server_id}')
+        return delete_from_queue(x, read_token, delete_token, server_id)
     except Exception as e:
         print("     Twitter image error: {}".format(str(e)))
+        return False
 
 
 def twitter_video(consumer_key, consumer_secret, access_token_key, access_token_secret, multimedia_url, caption, link_url, tags, x, read_token, delete_token, server_id):
@@ -379,7 +1331,7 @@ def twitter_video(consumer_key, consumer_secret, access_token_key, access_token_
     :param file_name:               The name of the local video file to be uploaded, as a string.
     :param caption:                 The post body, as a string.
     :param tags:                    Unprocessed hashtags, as a string.
-    :return:                        A Twitter submission object
+    :return:                        True if the post was published and deleted from the queue, otherwise False.
     :onerror:                       Prints error as a string.
     '''
     try:
@@ -399,9 +1351,10 @@ def twitter_video(consumer_key, consumer_secret, access_token_key, access_token_
         tweet = caption + '\n' + tags + '\n' + link_url
         post = api.update_status(status=tweet, media_ids=[media.media_id])
         print("     Deleting post from queue...")
-        requests.get(f'https://icy-fire.com/api/_d/{x}/auth={read_token}&{delete_token}&{server_id}')
+        return delete_from_queue(x, read_token, delete_token, server_id)
     except Exception as e:
         print("     Twitter video error: {}".format(str(e)))
+        return False
 
 
 def tumblr_short_text(consumer_key, consumer_secret, oauth_token, oauth_secret, blog_name, title, body, link_url, tags, x, read_token, delete_token, server_id):
@@ -417,7 +1370,7 @@ def tumblr_short_text(consumer_key, consumer_secret, oauth_token, oauth_secret,
     :param body:                The post body, as a string.
     :param link_url:            The link URL, as a string.
     :param tags:                Unprocessed tags, as a string.
-    :return:                    A Tumblr submission object
+    :return:                    True if the post was published and deleted from the queue, otherwise False.
     :onerror:                   Prints error as a string.
     '''
 
@@ -431,9 +1384,10 @@ def tumblr_short_text(consumer_key, consumer_secret, oauth_token, oauth_secret,
         else:
             client.create_text(blog_name, state="published", title=title, body=body + '\n' + link_url)
         print("     Deleting post from queue...")
-        requests.get(f'https://icy-fire.com/api/_d/{x}/auth={read_token}&{delete_token}&{server_id}')
+        return delete_from_queue(x, read_token, delete_token, server_id)
     except Exception as e:
         print("     Tumblr short text error: {}".format(str(e)))
+        return False
     
 
 def tumblr_long_text(consumer_key, consumer_secret, oauth_token, oauth_secret, blog_name, title, body, link_url, tags, x, read_token, delete_token, server_id):
@@ -449,7 +1403,7 @@ def tumblr_long_text(consumer_key, consumer_secret, oauth_token, oauth_secret, b
     :param body:                The post body, as a string.
     :param link_url:            The link URL, as a string.
     :param tags:                Unprocessed tags, as a string.
-    :return:                    A Tumblr submission object
+    :return:                    True if the post was published and deleted from the queue, otherwise False.
     :onerror:                   Prints error as a string.
     '''
     try:
@@ -462,9 +1416,10 @@ def tumblr_long_text(consumer_key, consumer_secret, oauth_token, oauth_secret, b
         else:
             client.create_text(blog_name, state="published", title=title, body=body + '\n' + link_url)
         print("     Deleting post from queue...")
-        requests.get(f'https://icy-fire.com/api/_d/{x}/auth={read_token}&{delete_token}&{server_id}')
+        return delete_from_queue(x, read_token, delete_token, server_id)
     except Exception as e:
         print("     Tumblr long text error: {}".format(str(e)))
+        return False
 
 
 def tumblr_image(consumer_key, consumer_secret, oauth_token, oauth_secret, blog_name, caption, link_url, tags, multimedia_url, x, read_token, delete_token, server_id):
@@ -480,7 +1435,7 @@ def tumblr_image(consumer_key, consumer_secret, oauth_token, oauth_secret, blog_
     :param link_url:            The link URL, as a string.
     :param tags:                Unprocessed tags, as a string.
     :param file_name:           The name of the local image file to be uploaded, as a string.
-    :return:                    A Tumblr submission object
+    :return:                    True if the post was published and deleted from the queue, otherwise False.
     :onerror:                   Prints error as a string.
     '''
     try:
@@ -495,9 +1450,10 @@ def tumblr_image(consumer_key, consumer_secret, oauth_token, oauth_secret, blog_
         else:
             client.create_photo(blog_name, state="published", caption=caption + '\n' + link_url, data=file_name)
         print("     Deleting post from queue...")
-        requests.get(f'https://icy-fire.com/api/_d/{x}/auth={read_token}&{delete_token}&{server_id}')
+        return delete_from_queue(x, read_token, delete_token, server_id)
     except Exception as e:
         print("     Tumblr image error: {}".format(str(e)))
+        return False
 
 
 def tumblr_video(consumer_key, consumer_secret, oauth_token, oauth_secret, blog_name, caption, link_url, tags, multimedia_url, x, read_token, delete_token, server_id):
@@ -513,7 +1469,7 @@ def tumblr_video(consumer_key, consumer_secret, oauth_token, oauth_secret, blog_
     :param link_url:            The link URL, as a string.
     :param tags:                Unprocessed tags, as a string.
     :param file_name:           The name of the local video file to be uploaded, as a string.
-    :return:                    A Tumblr submission object.
+    :return:                    True if the post was published and deleted from the queue, otherwise False.
     :onerror:                   Prints error as a string.
     '''
     try:
@@ -526,9 +1482,10 @@ def tumblr_video(consumer_key, consumer_secret, oauth_token, oauth_secret, blog_
         else:
             client.create_video(blog_name, state="published", caption=caption + '\n' + link_url, data=file_name)
         print("     Deleting post from queue...")
-        requests.get(f'https://icy-fire.com/api/_d/{x}/auth={read_token}&{delete_token}&{server_id}')
+        return delete_from_queue(x, read_token, delete_token, server_id)
     except Exception as e:
         print("     Tumblr video error: {}".format(str(e)))
+        return False
 
 
 def reddit_short_text(client_id, client_secret, user_agent, username, password, target_subreddit, title, body, link_url, x, read_token, delete_token, server_id):
@@ -543,7 +1500,7 @@ def reddit_short_text(client_id, client_secret, user_agent, username, password,
     :param target_subreddit:    The intended subreddit, as a string.
     :param body:                The body of the post, as a string.
     :param link_url:            The link URL, as a string.
-    :returns:                   A Reddit submission object.
+    :returns:                   True if the post was published and deleted from the queue, otherwise False.
     :onerror:                   Prints the error as a string.
     '''
     try:
@@ -552,9 +1509,10 @@ def reddit_short_text(client_id, client_secret, user_agent, username, password,
             link_url = ''
         reddit.subreddit(target_subreddit).submit(title, selftext=body + '\n' + link_url)
         print("     Deleting post from queue...")
-        requests.get(f'https://icy-fire.com/api/_d/{x}/auth={read_token}&{delete_token}&{server_id}')
+        return delete_from_queue(x, read_token, delete_token, server_id)
     except Exception as e:
         print('     Reddit short text error: {}'.format(str(e)))
+        return False
 
 
 def reddit_long_text(client_id, client_secret, user_agent, username, password, target_subreddit, title, body, link_url, x, read_token, delete_token, server_id):
@@ -569,7 +1527,7 @@ def reddit_long_text(client_id, client_secret, user_agent, username, password, t
     :param target_subreddit:    The intended subreddit, as a string.
     :param body:                The body of the post, as a string.
     :param link_url:            The link URL, as a string.
-    :returns:                   A Reddit submission object.
+    :returns:                   True if the post was published and deleted from the queue, otherwise False.
     :onerror:                   Prints the error as a string.
     '''
     try:
@@ -578,9 +1536,10 @@ def reddit_long_text(client_id, client_secret, user_agent, username, password, t
             link_url = ''
         reddit.subreddit(target_subreddit).submit(title, selftext=body + '\n' + link_url)
         print("     Deleting post from queue...")
-        requests.get(f'https://icy-fire.com/api/_d/{x}/auth={read_token}&{delete_token}&{server_id}')
+        return delete_from_queue(x, read_token, delete_token, server_id)
     except Exception as e:
         print('     Reddit long text error: {}'.format(str(e)))
+        return False
 
 
 def reddit_image(client_id, client_secret, user_agent, username, password, target_subreddit, title, multimedia_url, link_url, x, read_token, delete_token, server_id):
@@ -595,7 +1554,7 @@ def reddit_image(client_id, client_secret, user_agent, username, password, targe
     :param target_subreddit:    The intended subreddit, as a string.
     :param title:               The post title, as a string.
     :param file_name:           The name of the local image file to be uploaded, as a string.
-    :returns:                   A Reddit submission object.
+    :returns:                   True if the post was published and deleted from the queue, otherwise False.
     :onerror:                   Prints the error as a string.
     '''
     try:
@@ -604,9 +1563,10 @@ def reddit_image(client_id, client_secret, user_agent, username, password, targe
         reddit = praw.Reddit(client_id=client_id, client_secret=client_secret, user_agent=user_agent, username=username, password=password)
         reddit.subreddit(target_subreddit).submit_image(title=title, image_path=file_name)
         print("     Deleting post from queue...")
-        requests.get(f'https://icy-fire.com/api/_d/{x}/auth={read_token}&{delete_token}&{server_id}')
+        return delete_from_queue(x, read_token, delete_token, server_id)
     except Exception as e:
         print('     Reddit image error: {}'.format(str(e)))
+        return False
 
 
 def reddit_video(client_id, client_secret, user_agent, username, password, target_subreddit, title, multimedia_url, link_url, x, read_token, delete_token, server_id):
@@ -621,7 +1581,7 @@ def reddit_video(client_id, client_secret, user_agent, username, password, targe
     :param target_subreddit:    The intended subreddit, as a string.
     :param title:               The post title, as a string.
     :param file_name:           The name of the local video file to be uploaded, as a string.
-    :returns:                   A Reddit submission object.
+    :returns:                   True if the post was published and deleted from the queue, otherwise False.
     :onerror:                   Prints the error as a string.
     '''
     try:
@@ -630,9 +1590,575 @@ def reddit_video(client_id, client_secret, user_agent, username, password, targe
         reddit = praw.Reddit(client_id=client_id, client_secret=client_secret, user_agent=user_agent, username=username, password=password)
         reddit.subreddit(target_subreddit).submit_video(title=title, video_path=file_name)
         print("     Deleting post from queue...")
-        requests.get(f'https://icy-fire.com/api/_d/{x}/auth={read_token}&{delete_token}&{server_id}')
+        return delete_from_queue(x, read_token, delete_token, server_id)
     except Exception as e:
         print('     Reddit video error: {}'.format(str(e)))
+        return False
+
+
+def publish_post(x, post, callback):
+    '''
+    Decrypts the post's credentials and publishes it to the right platform. Any multimedia must already be in ./multimedia. Facebook text and image posts are queued for the next Graph batch instead.
+
+    :param x:           The timeslot ID, as an integer.
+    :param post:        The decoded JSON returned by the IcyFire API for this timeslot, as a dictionary.
+    :param callback:    A function called with True or False once a queued post has been published (or not).
+    :return:            True if the post was published and deleted from the queue, False if not, or None if it was queued and `callback` will be called later.
+    :rtype:             Boolean
+    :onerror:           Publishing errors are printed by the platform functions and reported as False.
+    '''
+    acknowledged = False
+
+    if post['platform'] == 'facebook':
+        access_token = decrypt_credentials(post, ('access_token',))['access_token']
+        page_id = post['page_id']
+
+        if post['post_type'] in (1, 2):
+            print("     Queueing Facebook {} text...".format('short' if post['post_type'] == 1 else 'long'))
+            queue_facebook_post(x, facebook_request(access_token, page_id, post['post_type'], facebook_message(post['body'], post['tags'], post['link_url'])), callback)
+            return None
+
+        elif post['post_type'] == 3:
+            print("     Queueing Facebook image...")
+            queue_facebook_post(x, facebook_request(access_token, page_id, 3, facebook_message(post['caption'], post['tags'], post.get('link_url')), post['multimedia_url']), callback)
+            return None
+
+        else:
+            print("     Posting Facebook video...")
+            acknowledged = facebook_video(access_token=access_token, page_id=page_id, caption=post['caption'], tags=post['tags'], link_url=post.get('link_url'), multimedia_url=post['multimedia_url'], x=x, read_token=read_token, delete_token=delete_token, server_id=server_id)
+            print("     Done.")
+
+    elif post['platform'] == 'twitter':
+        
+        creds = decrypt_credentials(post, ('consumer_key', 'consumer_secret', 'access_token_key', 'access_token_secret'))
+        consumer_key = creds['consumer_key']
+        consumer_secret = creds['consumer_secret']
+        access_token_key = creds['access_token_key']
+        access_token_secret = creds['access_token_secret']
+
+        if post['post_type'] == 1:
+            print("     Posting Twitter short text...")
+            acknowledged = twitter_short_text(consumer_key=consumer_key, consumer_secret=consumer_secret, access_token_key=access_token_key, access_token_secret=access_token_secret, body=post['body'], link_url=post['link_url'], tags=post['tags'], x=x, read_token=read_token, delete_token=delete_token, server_id=server_id)
+            print("     Done.")
+
+        elif post['post_type'] == 3:
+            print("     Posting Twitter image...")
+            acknowledged = twitter_image(consumer_key=consumer_key, consumer_secret=consumer_secret, access_token_key=access_token_key, access_token_secret=access_token_secret, multimedia_url=post['multimedia_url'], caption=post['caption'], tags=post['tags'], link_url=post['link_url'], x=x, read_token=read_token, delete_token=delete_token, server_id=server_id)
+            print("     Done.")
+
+        else:
+            print("     Posting Twitter video...")
+            acknowledged = twitter_video(consumer_key=consumer_key, consumer_secret=consumer_secret, access_token_key=access_token_key, access_token_secret=access_token_secret, multimedia_url=post['multimedia_url'], caption=post['caption'], tags=post['tags'], link_url=post['link_url'], x=x, read_token=read_token, delete_token=delete_token, server_id=server_id)
+            print("     Done.")
+
+    elif post['platform'] == 'tumblr':
+
+        creds = decrypt_credentials(post, ('consumer_key', 'consumer_secret', 'oauth_token', 'oauth_secret'))
+        consumer_key = creds['consumer_key']
+        consumer_secret = creds['consumer_secret']
+        oauth_token = creds['oauth_token']
+        oauth_secret = creds['oauth_secret']
+        blog_name = post['blog_name']
+
+        if post['post_type'] == 1:
+            print("     Posting Tumblr short text...")
+            acknowledged = tumblr_short_text(consumer_key=consumer_key, consumer_secret=consumer_secret, oauth_token=oauth_token, oauth_secret=oauth_secret, blog_name=blog_name, title=post['title'], body=post['body'], link_url=post['link_url'], tags=post['tags'], x=x, read_token=read_token, delete_token=delete_token, server_id=server_id)
+            print("     Done.")
+
+        elif post['post_type'] == 2:
+            print("     Posting Tumblr long text...")
+            acknowledged = tumblr_long_text(consumer_key=consumer_key, consumer_secret=consumer_secret, oauth_token=oauth_token, oauth_secret=oauth_secret, blog_name=blog_name, title=post['title'], body=post['body'], link_url=post['link_url'], tags=post['tags'], x=x, read_token=read_token, delete_token=delete_token, server_id=server_id)
+            print("     Done.")
+
+        elif post['post_type'] == 3:
+            print("     Posting Tumblr image...")
+            acknowledged = tumblr_image(consumer_key=consumer_key, consumer_secret=consumer_secret, oauth_token=oauth_token, oauth_secret=oauth_secret, blog_name=blog_name, caption=post['caption'], link_url=post['link_url'], tags=post['tags'], multimedia_url=post['multimedia_url'], x=x, read_token=read_token, delete_token=delete_token, server_id=server_id)
+            print("     Done.")
+
+        else:
+            print("     Posting Tumblr video...")
+            acknowledged = tumblr_video(consumer_key=consumer_key, consumer_secret=consumer_secret, oauth_token=oauth_token, oauth_secret=oauth_secret, blog_name=blog_name, caption=post['caption'], link_url=post['link_url'], tags=post['tags'], multimedia_url=post['multimedia_url'], x=x, read_token=read_token, delete_token=delete_token, server_id=server_id)
+            print("     Done.")
+
+    else:
+
+        creds = decrypt_credentials(post, ('client_id', 'client_secret', 'user_agent', 'username', 'password'))
+        client_id = creds['client_id']
+        client_secret = creds['client_secret']
+        user_agent = creds['user_agent']
+        username = creds['username']
+        password = creds['password']
+        target_subreddit = post['target_subreddit']
+
+        if post['post_type'] == 1:
+            print("     Posting Reddit short text...")
+            acknowledged = reddit_short_text(client_id=client_id, client_secret=client_secret, user_agent=user_agent, username=username, password=password, target_subreddit=target_subreddit, title=post['title'], body=post['body'], link_url=post['link_url'], x=x, read_token=read_token, delete_token=delete_token, server_id=server_id)
+            print("     Done.")
+
+        elif post['post_type'] == 2:
+            print("     Posting Reddit long text...")
+            acknowledged = reddit_long_text(client_id=client_id, client_secret=client_secret, user_agent=user_agent, username=username, password=password, target_subreddit=target_subreddit, title=post['title'], body=post['body'], link_url=post['link_url'], x=x, read_token=read_token, delete_token=delete_token, server_id=server_id)
+            print("     Done.")
+
+        elif post['post_type'] == 3:
+            print("     Posting Reddit image...")
+            acknowledged = reddit_image(client_id=client_id, client_secret=client_secret, user_agent=user_agent, username=username, password=password, target_subreddit=target_subreddit, title=post['title'], multimedia_url=post['multimedia_url'], x=x, read_token=read_token, delete_token=delete_token, server_id=server_id)
+            print("     Done.")
+
+        else:
+            print("     Posting Reddit video...")
+            acknowledged = reddit_video(client_id=client_id, client_secret=client_secret, user_agent=user_agent, username=username, password=password, target_subreddit=target_subreddit, title=post['title'], multimedia_url=post['multimedia_url'], x=x, read_token=read_token, delete_token=delete_token, server_id=server_id)
+            print("     Done.")
+
+    return acknowledged
+
+
+def slot_window(x, count):
+    '''
+    Lists `count` timeslot IDs starting at `x`, wrapping around at the end of the server's week.
+
+    :param x:       The first timeslot ID, as an integer.
+    :param count:   The number of timeslots, as an integer.
+    :return:        The timeslot IDs, grouped into runs of consecutive IDs.
+    :rtype:         List of lists of integers
+    :onerror:       No error handling.
+
+    Example usage: slot_window(10079, 4) on Server #1 would return [[10079, 10080], [1, 2]].
+    '''
+    start = calculate_min(server_id)
+    end = calculate_max(server_id)
+    runs = [[]]
+    for offset in range(count):
+        slot = start + (x - start + offset) % (end - start + 1)
+        if runs[-1] and slot != runs[-1][-1] + 1:
+            runs.append([])
+        runs[-1].append(slot)
+    return runs
+
+
+def read_slot_range(first, last):
+    '''
+    Reads timeslots `first` to `last` in one request to the range endpoint. The response is decoded as it streams in, either as one JSON object per line or as JSON pages linked by "next".
+
+    :param first:   The first timeslot ID, as an integer.
+    :param last:    The last timeslot ID, as an integer.
+    :return:        A status code and post (or None) for each timeslot, or None if the range endpoint isn't available or its response can't be decoded.
+    :rtype:         Dictionary
+    :onerror:       Raises request errors, so the caller can fall back to single reads.
+    '''
+    global range_reads_unavailable_at
+    slots = {}
+    url = f'https://icy-fire.com/api/_r/{first}-{last}/auth={read_token}&{cred_token}&{server_id}'
+    while url:
+        with session.get(url, stream=True) as response:
+            if response.status_code in (400, 404, 405, 501):
+                print("INFO: Range read endpoint unavailable ({}); reading timeslots one at a time.".format(response.status_code))
+                range_reads_unavailable_at = time.time()
+                return None
+            if response.status_code != 200:
+                raise Exception('range read status code {}'.format(response.status_code))
+            url = None
+            try:
+                if 'ndjson' in response.headers.get('Content-Type', ''):
+                    for line in response.iter_lines():
+                        if line:
+                            item = json.loads(line)
+                            slots[int(item['timeslot'])] = (int(item['status']), item.get('post'))
+                else:
+                    page = response.json()
+                    for item in page['slots']:
+                        slots[int(item['timeslot'])] = (int(item['status']), item.get('post'))
+                    url = page.get('next')
+            except (ValueError, KeyError, TypeError, AttributeError) as e:
+                print("INFO: Range read endpoint returned a malformed response ({}); reading timeslots one at a time.".format(repr(e)))
+                range_reads_unavailable_at = time.time()
+                return None
+    return slots
+
+
+def read_single_slot(x):
+    '''
+    Reads one timeslot from the IcyFire API.
+
+    :param x:       The timeslot ID, as an integer.
+    :return:        The status code and the post (or None).
+    :rtype:         Tuple
+    :onerror:       Returns status code 0 if the request fails.
+    '''
+    try:
+        read = session.get(f'https://icy-fire.com/api/_r/{x}/auth={read_token}&{cred_token}&{server_id}')
+    except Exception as e:
+        print("     Read error: {}".format(str(e)))
+        return 0, None
+    if read.status_code == 200:
+        return 200, read.json()
+    return read.status_code, None
+
+
+def refresh_schedule(x):
+    '''
+    Reads the next SCHEDULE_WINDOW timeslots starting at `x` into the local schedule: one request per run of consecutive slots through the range endpoint, or concurrent single reads over the pooled session if it isn't available.
+
+    :param x:       The first timeslot ID, as an integer.
+    :return:        None
+    :onerror:       Prints error as a string; slots that couldn't be read are read live when they come due.
+    '''
+    global schedule_refreshed_at
+    slots = {}
+    for run in slot_window(x, SCHEDULE_WINDOW):
+        result = None
+        if time.time() - range_reads_unavailable_at > RANGE_READ_RETRY_INTERVAL:
+            try:
+                result = read_slot_range(run[0], run[-1])
+            except Exception as e:
+                print("Range read error: {}".format(str(e)))
+                continue
+        if result is None:
+            with ThreadPoolExecutor(max_workers=READ_CONCURRENCY) as pool:
+                result = dict(zip(run, pool.map(read_single_slot, run)))
+            result = {slot: value for slot, value in result.items() if value[0] != 0}
+        slots.update(result)
+    with schedule_lock:
+        schedule.clear()
+        schedule.update(slots)
+        schedule_window.clear()
+        schedule_window.update(slot for run in slot_window(x, SCHEDULE_WINDOW) for slot in run)
+        schedule_refreshed_at = time.time()
+    print("Refreshed schedule: {} timeslot(s) from {}.".format(len(slots), x))
+
+
+def ensure_schedule(x):
+    '''
+    Refreshes the local schedule if it is more than SCHEDULE_REFRESH seconds old or its window doesn't include `x`.
+
+    :param x:       The timeslot ID, as an integer.
+    :return:        None
+    :onerror:       No error handling.
+    '''
+    with schedule_lock:
+        stale = time.time() - schedule_refreshed_at > SCHEDULE_REFRESH or x not in schedule_window
+    if stale:
+        refresh_schedule(x)
+
+
+def upcoming_posts(x):
+    '''
+    Lists the posts in the local schedule from timeslot `x` onwards, without removing them.
+
+    :param x:       The first timeslot ID, as an integer.
+    :return:        The timeslot IDs and posts, in timeslot order.
+    :rtype:         List of tuples
+    :onerror:       No error handling.
+    '''
+    ensure_schedule(x)
+    with schedule_lock:
+        return [(slot, post) for slot, (status_code, post) in sorted(schedule.items()) if status_code == 200 and post is not None]
+
+
+def read_slot(x):
+    '''
+    Returns timeslot `x` from the local schedule, refreshing the schedule first if it is more than SCHEDULE_REFRESH seconds old or its window doesn't include `x`. Slots the schedule says have a post are read again live, so a post deleted or edited since the schedule was refreshed is never published as it was; this costs one request only for slots that actually have posts.
+
+    :param x:       The timeslot ID, as an integer.
+    :return:        The status code and the post (or None).
+    :rtype:         Tuple
+    :onerror:       Falls back to a live read of the single timeslot.
+    '''
+    ensure_schedule(x)
+    with schedule_lock:
+        cached = schedule.pop(x, None)
+    if cached is not None and cached[0] != 200:
+        return cached
+    return read_single_slot(x)
+
+
+def slot_start(x, df):
+    '''
+    Uses `current_slot` to work out the UNIX timestamp at which timeslot `x` begins. Slots less than half a week behind the current one are treated as overdue rather than a week away.
+
+    :param x:       The timeslot ID, as an integer.
+    :param df:      A Pandas dataframe object generated by calling the `create_dataframe` function.
+    :return:        The UNIX timestamp of the start of the slot's minute.
+    :rtype:         Float
+    :onerror:       No error handling.
+
+    Example usage: slot_start(x=current_slot(df) + 2, df=df) at 12:00:30 would return the timestamp for 12:02:00 today.
+    '''
+    minute = time.time() // 60 * 60
+    while slot_clock.get('minute') != minute or slot_clock.get('df') is not df:
+        slot_clock.update(minute=minute, df=df, slot=current_slot(df))
+        # current_slot reads the clock itself, so try again if the minute turned over in between.
+        minute = time.time() // 60 * 60
+    week = len(df)
+    offset = (x - slot_clock['slot']) % week
+    if offset > week // 2:
+        offset -= week
+    return minute + offset * 60
+
+
+def timing_key(post):
+    '''
+    Returns the key that stage durations and lateness are tracked under, e.g. "twitter/3".
+
+    :param post:    The decoded JSON returned by the IcyFire API for a timeslot, as a dictionary.
+    :return:        The key.
+    :rtype:         String
+    :onerror:       No error handling.
+    '''
+    return '{}/{}'.format(post['platform'], post['post_type'])
+
+
+def record_timing(key, stage, seconds):
+    '''
+    Adds a stage duration ("media" or "publish") to the rolling history for a platform and post type.
+
+    :param key:     A key generated by calling the `timing_key` function.
+    :param stage:   The stage name, as a string.
+    :param seconds: The duration, as a float.
+    :return:        None
+    :onerror:       No error handling.
+    '''
+    with timing_lock:
+        stage_timings.setdefault('{}/{}'.format(key, stage), deque(maxlen=TIMING_HISTORY)).append(seconds)
+
+
+def record_lateness(key, seconds):
+    '''
+    Adds how far from its target second a post went out (negative if early) to the rolling history for a platform and post type.
+
+    :param key:     A key generated by calling the `timing_key` function.
+    :param seconds: The lateness, as a float.
+    :return:        None
+    :onerror:       No error handling.
+    '''
+    with timing_lock:
+        lateness_history.setdefault(key, deque(maxlen=LATENESS_HISTORY)).append(seconds)
+
+
+def percentile(values, fraction):
+    '''
+    Returns the value below which `fraction` of the values fall.
+
+    :param values:      The values, as a list of floats.
+    :param fraction:    The fraction, between 0 and 1, as a float.
+    :return:            The percentile.
+    :rtype:             Float
+    :onerror:           No error handling.
+
+    Example usage: percentile([1, 2, 3, 4], 0.5) would return 2.
+    '''
+    ordered = sorted(values)
+    return ordered[int(fraction * (len(ordered) - 1))]
+
+
+def estimate_duration(key, stage, fraction, default):
+    '''
+    Estimates how long a stage will take for a platform and post type from its rolling history.
+
+    :param key:         A key generated by calling the `timing_key` function.
+    :param stage:       The stage name, as a string.
+    :param fraction:    The percentile to use, between 0 and 1, as a float.
+    :param default:     The estimate to use until there is any history, in seconds, as a float.
+    :return:            The estimate in seconds.
+    :rtype:             Float
+    :onerror:           No error handling.
+    '''
+    with timing_lock:
+        history = list(stage_timings.get('{}/{}'.format(key, stage), ()))
+    if not history:
+        return default
+    return percentile(history, fraction)
+
+
+def publish_lead(post):
+    '''
+    Returns how many seconds before its target second a post's publish call should start: the median publish duration, capped at MAX_PUBLISH_LEAD.
+
+    :param post:    The decoded JSON returned by the IcyFire API for a timeslot, or None.
+    :return:        The lead in seconds.
+    :rtype:         Float
+    :onerror:       No error handling.
+    '''
+    if post is None:
+        return 0
+    return min(estimate_duration(timing_key(post), 'publish', 0.5, 0), MAX_PUBLISH_LEAD)
+
+
+def prepare_multimedia(x, post):
+    '''
+    Downloads and stages a post's multimedia, recording how long it took.
+
+    :param x:       The timeslot ID, as an integer.
+    :param post:    The decoded JSON returned by the IcyFire API for this timeslot, as a dictionary.
+    :return:        The file name to upload, or None if the file can't be made to fit.
+    :rtype:         String
+    :onerror:       No error handling.
+    '''
+    started = time.time()
+    print("     Downloading multimedia for timeslot {}...".format(x))
+    download_multimedia(post['multimedia_url'])
+    staged = stage_multimedia(post['multimedia_url'], post['platform'], post['post_type'])
+    record_timing(timing_key(post), 'media', time.time() - started)
+    return staged
+
+
+def prefetch_media(x, df):
+    '''
+    Starts downloading and staging multimedia for upcoming slots in the background, as soon as the slot's expected media and publish durations say it's needed to hit the target second.
+
+    :param x:       The next timeslot to be published, as an integer.
+    :param df:      A Pandas dataframe object generated by calling the `create_dataframe` function.
+    :return:        None
+    :onerror:       No error handling.
+    '''
+    global prefetch_pool
+    for slot, post in upcoming_posts(x):
+        multimedia_url = post.get('multimedia_url') if post['post_type'] not in (1, 2) else None
+        if not multimedia_url or slot in prepared or is_awaiting_ack(slot):
+            continue
+        lead = estimate_duration(timing_key(post), 'media', 0.9, DEFAULT_MEDIA_LEAD) + publish_lead(post) + PREFETCH_MARGIN
+        if time.time() < slot_start(slot, df) + SLOT_TARGET_SECOND - lead:
+            continue
+        if prefetch_pool is None:
+            prefetch_pool = ThreadPoolExecutor(max_workers=2)
+        retain_multimedia(multimedia_url, slot)
+        prepared[slot] = (multimedia_url, prefetch_pool.submit(prepare_multimedia, slot, post))
+
+
+def report_slo():
+    '''
+    Prints how many posts went out within SLO_TARGET seconds of their target second, per platform and post type and overall, and saves the timing history.
+
+    :return:        None
+    :onerror:       No error handling.
+    '''
+    with timing_lock:
+        history = {key: list(values) for key, values in lateness_history.items() if values}
+    everything = [value for values in history.values() for value in values]
+    if not everything:
+        return
+    for key, values in sorted(history.items()):
+        within = sum(1 for value in values if abs(value) <= SLO_TARGET)
+        print("SLO {}: {:.1f}% of {} post(s) within {}s (p50 {:+.1f}s, p99 {:+.1f}s)".format(key, 100.0 * within / len(values), len(values), SLO_TARGET, percentile(values, 0.5), percentile(values, 0.99)))
+    within = 100.0 * sum(1 for value in everything if abs(value) <= SLO_TARGET) / len(everything)
+    print("SLO overall: {:.1f}% within {}s (target {}%): {}".format(within, SLO_TARGET, SLO_PERCENT, 'met' if within >= SLO_PERCENT else 'MISSED'))
+    save_timings()
+
+
+def load_timings():
+    '''
+    Restores the stage duration and lateness history saved in TIMINGS_FILE, so lead times are right straight after a restart.
+
+    :return:        None
+    :onerror:       Prints error as a string and starts with no history.
+    '''
+    if not os.path.exists(TIMINGS_FILE):
+        return
+    try:
+        with open(TIMINGS_FILE) as f:
+            saved = json.load(f)
+        with timing_lock:
+            for key, values in saved['stages'].items():
+                stage_timings[key] = deque(values, maxlen=TIMING_HISTORY)
+            for key, values in saved['lateness'].items():
+                lateness_history[key] = deque(values, maxlen=LATENESS_HISTORY)
+    except Exception as e:
+        print("Load timings error: {}".format(str(e)))
+
+
+def save_timings():
+    '''
+    Atomically writes the stage duration and lateness history to TIMINGS_FILE.
+
+    :return:        None
+    :onerror:       Prints error as a string.
+    '''
+    try:
+        with timing_lock:
+            saved = {'stages': {key: list(values) for key, values in stage_timings.items()}, 'lateness': {key: list(values) for key, values in lateness_history.items()}}
+        with open(TIMINGS_FILE + '.tmp', 'w') as f:
+            json.dump(saved, f)
+        os.replace(TIMINGS_FILE + '.tmp', TIMINGS_FILE)
+    except Exception as e:
+        print("Save timings error: {}".format(str(e)))
+
+
+def process_slot(x, target):
+    '''
+    Looks up timeslot `x` in the local schedule and publishes whatever is queued there, using any multimedia already prefetched for it.
+
+    :param x:       The timeslot ID, as an integer.
+    :param target:  The UNIX timestamp the post should go out at, as a float.
+    :return:        None
+    :onerror:       Exceptions propagate to the caller, which keeps the server running.
+    '''
+    print("Querying timeslot {}:".format(x))
+    prefetched = prepared.pop(x, None)
+    awaiting_ack = is_awaiting_ack(x)
+    if awaiting_ack:
+        print("     INFO: Already published; waiting for the queue deletion to be confirmed.")
+        status_code, post = 0, None
+    else:
+        status_code, post = read_slot(x)
+    multimedia_url = None
+    if status_code == 200 and post['post_type'] not in (1, 2):
+        multimedia_url = post.get('multimedia_url')
+    # The post may have changed since its multimedia was prefetched.
+    if prefetched is not None and prefetched[0] != multimedia_url:
+        release_multimedia(prefetched[0], x, False)
+        prefetched = None
+    if awaiting_ack:
+        return
+
+    if status_code == 200:
+        key = timing_key(post)
+        publish_started = None
+
+        def finish(acknowledged):
+            if publish_started is not None:
+                finished = time.time()
+                record_timing(key, 'publish', finished - publish_started)
+                if acknowledged:
+                    record_lateness(key, finished - target)
+                    print("     Timeslot {} went out {:+.1f}s from its target.".format(x, finished - target))
+            if multimedia_url and acknowledged:
+                release_multimedia_on_ack(multimedia_url, x)
+            elif multimedia_url:
+                release_multimedia(multimedia_url, x, False)
+
+        acknowledged = False
+        if multimedia_url and prefetched is None:
+            retain_multimedia(multimedia_url, x)
+        try:
+            if multimedia_url:
+                if prefetched is not None:
+                    staged = prefetched[1].result()
+                else:
+                    staged = prepare_multimedia(x, post)
+                if staged is None:
+                    print("     ERROR: Multimedia does not fit the platform's limits; skipping post.")
+                    return
+                post = dict(post, multimedia_url=staged)
+            publish_started = time.time()
+            acknowledged = publish_post(x, post, finish)
+        finally:
+            if acknowledged is not None:
+                finish(acknowledged)
+
+    elif status_code == 400:
+        print("     ERROR: Malformed request; timeslot not found.")
+    
+    elif status_code == 404:
+        print("     INFO: Queue is empty; post not found.")
+
+    elif status_code == 218:
+        print("     INFO: Timeslot not assigned. This is fine.")
+    
+    elif status_code == 403:
+        print("     ERROR: Authentication error; check your authentication tokens.")
+    
+    else:
+        print("     INFO: Can't connect to web server.")
 
 
 def main():
@@ -672,177 +2198,79 @@ def main():
     print("Starting at timeslot {}".format(x))
     print("Running...")
 
-    y = 0
-
-    while x < end + 1:
-        print("Querying timeslot {}:".format(x))
-        read = requests.get(f'https://icy-fire.com/api/_r/{x}/auth={read_token}&{cred_token}&{server_id}')
-        
-        if read.status_code == 200:
-
-            if read.json()['platform'] == 'facebook':
-                access_token = decrypt(read.json()['access_token'])
-                page_id = read.json()['page_id']
-
-                if read.json()['post_type'] == 1:
-                    print("     Posting Facebook short text...")
-                    facebook_short_text(access_token=access_token, page_id=page_id, body=read.json()['body'], link_url=read.json()['link_url'], tags=read.json()['tags'], x=x, read_token=read_token, delete_token=delete_token, server_id=server_id)
-                    print("Done.")
-
-                elif read.json()['post_type'] == 2:
-                    print("     Posting Facebook long text...")
-                    facebook_long_text(access_token=access_token, page_id=page_id, body=read.json()['body'], link_url=read.json()['link_url'], tags=read.json()['tags'], x=x, read_token=read_token, delete_token=delete_token, server_id=server_id)
-                    print("     Done.")
-
-                elif read.json()['post_type'] == 3:
-                    print("     Downloading multimedia...")
-                    download_multimedia(read.json()['multimedia_url'])
-                    print("     Posting Facebook image...")
-                    facebook_image(access_token=access_token, page_id=page_id, caption=read.json()['caption'], tags=read.json()['tags'], multimedia_url=read.json()['multimedia_url'], x=x, read_token=read_token, delete_token=delete_token, server_id=server_id)
-                    print("     Deleting multimedia...")
-                    delete_multimedia(read.json()['multimedia_url'])
-                    print("     Done.")
-
-                else:
-                    print("     Downloading multimedia...")
-                    download_multimedia(read.json()['multimedia_url'])
-                    print("     Posting Facebook video...")
-                    facebook_image(access_token=access_token, page_id=page_id, caption=read.json()['caption'], tags=read.json()['tags'], multimedia_url=read.json()['multimedia_url'], x=x, read_token=read_token, delete_token=delete_token, server_id=server_id)
-                    print("     Deleting multimedia...")
-                    delete_multimedia(read.json()['multimedia_url'])
-                    print("     Done.")
-
-            elif read.json()['platform'] == 'twitter':
-                
-                consumer_key = decrypt(read.json()['consumer_key'])
-                consumer_secret = decrypt(read.json()['consumer_secret'])
-                access_token_key = decrypt(read.json()['access_token_key'])
-                access_token_secret = decrypt(read.json()['access_token_secret'])
-
-                if read.json()['post_type'] == 1:
-                    print("     Posting Twitter short text...")
-                    twitter_short_text(consumer_key=consumer_key, consumer_secret=consumer_secret, access_token_key=access_token_key, access_token_secret=access_token_secret, body=read.json()['body'], link_url=read.json()['link_url'], tags=read.json()['tags'], x=x, read_token=read_token, delete_token=delete_token, server_id=server_id)
-                    print("     Done.")
-
-                elif read.json()['post_type'] == 3:
-                    print("     Downloading multimedia...")
-                    download_multimedia(read.json()['multimedia_url'])
-                    print("     Posting Twitter image...")
-                    twitter_image(consumer_key=consumer_key, consumer_secret=consumer_secret, access_token_key=access_token_key, access_token_secret=access_token_secret, multimedia_url=read.json()['multimedia_url'], caption=read.json()['caption'], tags=read.json()['tags'], link_url=read.json()['link_url'], x=x, read_token=read_token, delete_token=delete_token, server_id=server_id)
-                    print("     Deleting multimedia...")
-                    delete_multimedia(read.json()['multimedia_url'])
-                    print("     Done.")
+    install_signal_handlers()
+    load_acks()
+    load_remote_deletions()
+    # Hooks run in order: confirm the last acknowledgements, then delete the multimedia they release.
+    on_shutdown(flush_acks)
+    on_shutdown(flush_remote_multimedia)
+    on_shutdown(stop_media_pools)
+    on_shutdown(clear_credential_cache)
+    start_worker('acks', send_acks)
+    start_worker('media-gc', collect_garbage)
+    load_timings()
+    on_shutdown(save_timings)
+    reported_at = time.time()
+
+    while not shutdown_requested.is_set():
+        if reload_requested.is_set():
+            reload_requested.clear()
+            print("Received SIGHUP; reloading configuration...")
+            old_server_id = server_id
+            try:
+                load_config(override=True)
+            except Exception as e:
+                print("Config reload error: {}".format(str(e)))
+            clear_credential_cache()
+            if server_id != old_server_id:
+                print("Server ID changed from {} to {}; recalculating timeslots...".format(old_server_id, server_id))
+                start = calculate_min(server_id)
+                end = calculate_max(server_id)
+                df = create_dataframe(start, end)
+                x = current_slot(df)
+                print("Starting at timeslot {}".format(x))
+
+        supervise_workers()
+
+        # Waiting for the slot's own minute, rather than sleeping a fixed 60 seconds, keeps the loop from drifting away from the clock.
+        # The publish call starts early by its usual duration, and multimedia is staged ahead of that, so the post goes out on the target second.
+        target = slot_start(x, df) + SLOT_TARGET_SECOND
+        with schedule_lock:
+            entry = schedule.get(x)
+        publish_at = target - publish_lead(entry[1] if entry and entry[0] == 200 else None)
+        if publish_at > time.time():
+            # Facebook posts wait in the outbox until the loop has caught up, so that slots that came due together share one Graph batch.
+            flush_facebook_outbox()
+            print("Sleeping until timeslot {}...".format(x))
+            while time.time() < publish_at and not shutdown_requested.is_set() and not reload_requested.is_set():
+                try:
+                    prefetch_media(x, df)
+                except Exception as e:
+                    print("Prefetch error: {}".format(str(e)))
+                wait_until(min(publish_at, time.time() + PREFETCH_POLL))
+            if time.time() < publish_at:
+                continue
 
-                else:
-                    print("     Downloading multimedia...")
-                    download_multimedia(read.json()['multimedia_url'])
-                    print("     Posting Twitter video...")
-                    twitter_video(consumer_key=consumer_key, consumer_secret=consumer_secret, access_token_key=access_token_key, access_token_secret=access_token_secret, multimedia_url=read.json()['multimedia_url'], caption=read.json()['caption'], tags=read.json()['tags'], link_url=read.json()['link_url'], x=x, read_token=read_token, delete_token=delete_token, server_id=server_id)
-                    print("     Deleting multimedia...")
-                    delete_multimedia(read.json()['multimedia_url'])
-                    print("     Done.")
-
-            elif read.json()['platform'] == 'tumblr':
-
-                consumer_key = decrypt(read.json()['consumer_key'])
-                consumer_secret = decrypt(read.json()['consumer_secret'])
-                oauth_token = decrypt(read.json()['oauth_token'])
-                oauth_secret = decrypt(read.json()['oauth_secret'])
-                blog_name = read.json()['blog_name']
-
-                if read.json()['post_type'] == 1:
-                    print("     Posting Tumblr short text...")
-                    tumblr_short_text(consumer_key=consumer_key, consumer_secret=consumer_secret, oauth_token=oauth_token, oauth_secret=oauth_secret, blog_name=blog_name, title=read.json()['title'], body=read.json()['body'], link_url=read.json()['link_url'], tags=read.json()['tags'], x=x, read_token=read_token, delete_token=delete_token, server_id=server_id)
-                    print("     Done.")
-
-                elif read.json()['post_type'] == 2:
-                    print("     Posting Tumblr long text...")
-                    tumblr_long_text(consumer_key=consumer_key, consumer_secret=consumer_secret, oauth_token=oauth_token, oauth_secret=oauth_secret, blog_name=blog_name, title=read.json()['title'], body=read.json()['body'], link_url=read.json()['link_url'], tags=read.json()['tags'], x=x, read_token=read_token, delete_token=delete_token, server_id=server_id)
-                    print("     Done.")
-
-                elif read.json()['post_type'] == 3:
-                    print("     Downloading multimedia...")
-                    download_multimedia(read.json()['multimedia_url'])
-                    print("     Posting Tumblr image...")
-                    tumblr_image(consumer_key=consumer_key, consumer_secret=consumer_secret, oauth_token=oauth_token, oauth_secret=oauth_secret, blog_name=blog_name, caption=read.json()['caption'], link_url=read.json()['link_url'], tags=read.json()['tags'], multimedia_url=read.json()['multimedia_url'], x=x, read_token=read_token, delete_token=delete_token, server_id=server_id)
-                    print("     Deleting multimedia...")
-                    delete_multimedia(read.json()['multimedia_url'])
-                    print("     Done.")
-
-                else:
-                    print("     Downloading multimedia...")
-                    download_multimedia(read.json()['multimedia_url'])
-                    print("     Posting Tumblr video...")
-                    tumblr_video(consumer_key=consumer_key, consumer_secret=consumer_secret, oauth_token=oauth_token, oauth_secret=oauth_secret, blog_name=blog_name, caption=read.json()['caption'], link_url=read.json()['link_url'], tags=read.json()['tags'], multimedia_url=read.json()['multimedia_url'], x=x, read_token=read_token, delete_token=delete_token, server_id=server_id)
-                    print("     Deleting multimedia...")
-                    delete_multimedia(read.json()['multimedia_url'])
-                    print("     Done.")
-
-            else:
-
-                client_id = decrypt(read.json()['client_id'])
-                client_secret = decrypt(read.json()['client_secret'])
-                user_agent = decrypt(read.json()['user_agent'])
-                username = decrypt(read.json()['username'])
-                password = decrypt(read.json()['password'])
-                target_subreddit = read.json()['target_subreddit']
-
-                if read.json()['post_type'] == 1:
-                    print("     Posting Reddit short text...")
-                    reddit_short_text(client_id=client_id, client_secret=client_secret, user_agent=user_agent, username=username, password=password, target_subreddit=target_subreddit, title=read.json()['title'], body=read.json()['body'], link_url=read.json()['link_url'], x=x, read_token=read_token, delete_token=delete_token, server_id=server_id)
-                    print("     Done.")
-
-                elif read.json()['post_type'] == 2:
-                    print("     Posting Reddit long text...")
-                    reddit_long_text(client_id=client_id, client_secret=client_secret, user_agent=user_agent, username=username, password=password, target_subreddit=target_subreddit, title=read.json()['title'], body=read.json()['body'], link_url=read.json()['link_url'], x=x, read_token=read_token, delete_token=delete_token, server_id=server_id)
-                    print("     Done.")
-
-                elif read.json()['post_type'] == 3:
-                    print("     Downloading multimedia...")
-                    download_multimedia(read.json()['multimedia_url'])
-                    print("     Posting Reddit image...")
-                    reddit_image(client_id=client_id, client_secret=client_secret, user_agent=user_agent, username=username, password=password, target_subreddit=target_subreddit, title=read.json()['title'], multimedia_url=read.json()['multimedia_url'], x=x, read_token=read_token, delete_token=delete_token, server_id=server_id)
-                    print("     Deleting multimedia...")
-                    delete_multimedia(read.json()['multimedia_url'])
-                    print("     Done.")
-
-                else:
-                    print("     Downloading multimedia...")
-                    download_multimedia(read.json()['multimedia_url'])
-                    print("     Posting Reddit video...")
-                    reddit_video(client_id=client_id, client_secret=client_secret, user_agent=user_agent, username=username, password=password, target_subreddit=target_subreddit, title=read.json()['title'], multimedia_url=read.json()['multimedia_url'], x=x, read_token=read_token, delete_token=delete_token, server_id=server_id)
-                    print("     Deleting multimedia...")
-                    delete_multimedia(read.json()['multimedia_url'])
-                    print("     Done.")
-
-        elif read.status_code == 400:
-            print("     ERROR: Malformed request; timeslot not found.")
-        
-        elif read.status_code == 404:
-            print("     INFO: Queue is empty; post not found.")
-
-        elif read.status_code == 218:
-            print("     INFO: Timeslot not assigned. This is fine.")
-        
-        elif read.status_code == 403:
-            print("     ERROR: Authentication error; check your authentication tokens.")
-        
-        else:
-            print("     INFO: Can't connect to web server.")
+        try:
+            process_slot(x, target)
+        except Exception as e:
+            print("     ERROR: Timeslot {} failed: {}".format(x, str(e)))
 
         x += 1
-        y += 1
+        if x == end + 1:
+            x = start
 
-        print("Sleeping for 60 seconds...")
-        time.sleep(60)
+        if time.time() - reported_at > SLO_REPORT_INTERVAL:
+            report_slo()
+            reported_at = time.time()
+
+    print("Received shutdown signal; finishing in-flight work before exiting...")
+    flush_facebook_outbox()
+    print("Draining...")
+    drain()
+    report_slo()
+    print("Stopped.")
 
-        # Fun fact: time.sleep distorts by ~1 minute every 120 minutes of runtime on Linux (https://stackoverflow.com/questions/1133857/how-accurate-is-pythons-time-sleep#:~:text=Here's%20my%20follow-up%20to%20Wilbert's%20answer:%20the%20same%20for%20Mac%20OS%20X%20Yosemite,%20since%20it's%20not%20been%20mentioned%20much%20yet)
-        # Because this is running in another while loop in run.sh, we are able to break this loop every 120 minutes
-        if y == 120:
-            break
 
-        if x == end + 1:
-            x = start
-    
 if __name__ == '__main__':
     main()
@@ -5,8 +5,8 @@ sudo apt install libffi-dev
 sudo apt-get install python-dev libatlas-base-dev
 python3 -m pip install -r requirements.txt
 
-while true
+# main.py supervises itself and exits 0 after a graceful SIGTERM, so only restart it if it crashed outright.
+until python3 main.py
 do
-python3 main.py
 sleep 1
-done
\ No newline at end of file
+done